@@ -0,0 +1,278 @@
+import argparse,mmap,os,random,struct
+from sudoku_generator import difficulty_levels, generate_sudoku_batch
+from sudoku_canon import PuzzleIndex, unique_puzzles
+
+"""
+Puzzle bank: a compact binary file of pre-generated puzzles that the game can
+pick from instead of generating a puzzle while the player waits.
+
+Layout (all integers little-endian):
+header      magic b'SDKB', version (u8), board size (u8), bits per cell (u8),
+            number of difficulties (u8), record size in bytes (u16), reserved (u16)
+index       one entry per difficulty: name (16 bytes, NUL padded),
+            first record number (u32), record count (u32)
+records     grouped by difficulty in index order; each record is the solution packed
+            at bits-per-cell (value - 1, so 4 bits per cell for 9x9 and 16x16) followed
+            by a bitmask of the given cells (1 bit per cell)
+
+Records are fixed-size, so reading puzzle i of a difficulty is one slice of the mmap.
+
+"""
+
+MAGIC = b'SDKB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBHH')
+INDEX_ENTRY = struct.Struct('<16sII')
+UNIQUE_TIME_BUDGET = 2.0  # default seconds of unique removal per generated puzzle
+HEX_VALUES = {digit: i + 1 for i, digit in enumerate('0123456789abcdef')}  # hex digit -> cell value
+
+'''
+Returns the number of bits needed per solution cell and the record size for a board size
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return: (cell_bits, record_size)
+'''
+def record_layout(size):
+    cells = size * size
+    cell_bits = (size - 1).bit_length()
+    return cell_bits, (cells * cell_bits + 7) // 8 + (cells + 7) // 8
+
+'''
+Packs one (board, solution) pair, as returned by generate_sudoku, into a record
+
+Parameters:
+board is the puzzle as a 2D list of ints (0 for empty)
+solution is the solved 2D list of ints
+
+Return: bytes
+'''
+def pack_puzzle(board, solution):
+    size = len(solution)
+    cells = size * size
+    cell_bits, _ = record_layout(size)
+    values = 0
+    givens = 0
+    for row in range(size):
+        for col in range(size):
+            values = (values << cell_bits) | (solution[row][col] - 1)
+            givens = (givens << 1) | (board[row][col] != 0)
+    return values.to_bytes((cells * cell_bits + 7) // 8, 'big') + givens.to_bytes((cells + 7) // 8, 'big')
+
+'''
+Unpacks a record back into a (board, solution) pair of 2D lists
+
+Parameters:
+record is the bytes (or memoryview) of one record
+size is the number of rows/columns of the board
+
+Return: (board, solution)
+'''
+def unpack_puzzle(record, size):
+    cells = size * size
+    cell_bits, _ = record_layout(size)
+    value_bytes = (cells * cell_bits + 7) // 8
+    if cell_bits == 4:
+        # one hex digit per cell; an odd cell count leaves one padding nibble at the front
+        digits = bytes(record[:value_bytes]).hex()[-cells:]
+        flat_solution = [HEX_VALUES[digit] for digit in digits]
+    else:
+        values = int.from_bytes(record[:value_bytes], 'big')
+        mask = (1 << cell_bits) - 1
+        flat_solution = [0] * cells
+        for i in range(cells - 1, -1, -1):
+            flat_solution[i] = (values & mask) + 1
+            values >>= cell_bits
+    givens = format(int.from_bytes(record[value_bytes:], 'big'), 'b').zfill(cells)[-cells:]
+    flat_board = [num if given == '1' else 0 for num, given in zip(flat_solution, givens)]
+    solution = [flat_solution[row * size:(row + 1) * size] for row in range(size)]
+    board = [flat_board[row * size:(row + 1) * size] for row in range(size)]
+    return board, solution
+
+'''
+Read-only view of a puzzle bank file through mmap
+The file is never read into memory; each lookup touches a single record
+
+self.path		- the bank file path
+self.size		- the number of rows/columns of the boards in the bank
+self.index		- dict of difficulty name -> (first record number, record count)
+'''
+class PuzzleBank:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.cell_bits, difficulties, self.record_size, _ = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f'{path} is not a version {VERSION} puzzle bank')
+        self.index = {}
+        for i in range(difficulties):
+            name, first, count = INDEX_ENTRY.unpack_from(self.data, HEADER.size + i * INDEX_ENTRY.size)
+            self.index[name.rstrip(b'\0').decode()] = (first, count)
+        self.records_offset = HEADER.size + difficulties * INDEX_ENTRY.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.data.close()
+
+    '''
+    Returns the number of puzzles stored for difficulty (0 if there are none)
+    '''
+    def count(self, difficulty):
+        return self.index.get(difficulty, (0, 0))[1]
+
+    '''
+    Returns the raw bytes of puzzle i of difficulty
+
+	Parameters:
+	difficulty is the difficulty name, e.g. 'easy'
+	i is the puzzle number within that difficulty
+
+	Return: bytes
+    '''
+    def record(self, difficulty, i):
+        first, count = self.index[difficulty]
+        if not 0 <= i < count:
+            raise IndexError(f'{difficulty} puzzle {i} out of range ({count} stored)')
+        start = self.records_offset + (first + i) * self.record_size
+        return self.data[start:start + self.record_size]
+
+    '''
+    Returns puzzle i of difficulty as a (board, solution) pair, like generate_sudoku
+    '''
+    def get(self, difficulty, i):
+        return unpack_puzzle(self.record(difficulty, i), self.size)
+
+    '''
+    Returns a random puzzle of difficulty as a (board, solution) pair
+    Raises KeyError if the bank holds no puzzles for that difficulty
+
+	Parameters:
+	difficulty is the difficulty name, e.g. 'easy'
+	rng is the random generator to use
+
+	Return: (board, solution)
+    '''
+    def random_puzzle(self, difficulty, rng=random):
+        count = self.count(difficulty)
+        if count == 0:
+            raise KeyError(f'no {difficulty} puzzles in {self.path}')
+        return self.get(difficulty, rng.randrange(count))
+
+'''
+Appends puzzles to a bank file in bulk, creating the file if it does not exist
+When the difficulty is the last section of the bank, the records are written after it and
+only its index entry is updated in place (after the records are on disk, so a crash leaves
+at most some uncounted bytes that the next append overwrites). Otherwise records must stay
+grouped by difficulty, so the bank is rewritten to a temporary file (copying the existing
+records as raw bytes) and swapped in atomically. Either way, readers that already have the
+file mapped keep a consistent view
+
+Parameters:
+path is the bank file path
+difficulty is the difficulty name to file the puzzles under (at most 16 bytes)
+puzzles is an iterable of (board, solution) pairs, e.g. from generate_sudoku_batch
+
+Return: int (the number of puzzles appended)
+'''
+def append_puzzles(path, difficulty, puzzles):
+    records = []
+    size = None
+    for board, solution in puzzles:
+        if size is None:
+            size = len(solution)
+        elif len(solution) != size:
+            raise ValueError('all puzzles in a bank must have the same size')
+        records.append(pack_puzzle(board, solution))
+    if not records:
+        return 0
+
+    sections = {}
+    tail = None
+    if os.path.exists(path):
+        with PuzzleBank(path) as bank:
+            if bank.size != size:
+                raise ValueError(f'{path} holds {bank.size}x{bank.size} puzzles, not {size}x{size}')
+            names = list(bank.index)
+            if names and names[-1] == difficulty:
+                first, count = bank.index[difficulty]
+                entry = HEADER.size + (len(names) - 1) * INDEX_ENTRY.size
+                tail = (entry, bank.records_offset + (first + count) * bank.record_size, first, count)
+            else:
+                for name, (first, count) in bank.index.items():
+                    start = bank.records_offset + first * bank.record_size
+                    sections[name] = [bank.data[start:start + count * bank.record_size]]
+    if tail is not None:
+        # the bank is closed first: its mapping must not see the file shrink
+        entry, end, first, count = tail
+        append_section_tail(path, entry, end, difficulty, first, count, records)
+        return len(records)
+    sections.setdefault(difficulty, []).append(b''.join(records))
+
+    cell_bits, record_size = record_layout(size)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, cell_bits, len(sections), record_size, 0))
+        first = 0
+        for name, chunks in sections.items():
+            count = sum(len(chunk) for chunk in chunks) // record_size
+            f.write(INDEX_ENTRY.pack(name.encode(), first, count))
+            first += count
+        for chunks in sections.values():
+            for chunk in chunks:
+                f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records)
+
+'''
+Appends records to the last section of a bank in place: the records go after the counted
+ones (dropping anything a crashed append left there), and the index entry at offset entry
+is rewritten with the new count only once they are on disk
+'''
+def append_section_tail(path, entry, end, difficulty, first, count, records):
+    with open(path, 'r+b') as f:
+        f.truncate(end)
+        f.seek(end)
+        f.write(b''.join(records))
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(entry)
+        f.write(INDEX_ENTRY.pack(difficulty.encode(), first, count + len(records)))
+        f.flush()
+        os.fsync(f.fileno())
+
+'''
+Builds or extends a bank from the command line, generating count puzzles per difficulty level:
+python3 sudoku_bank.py puzzles.bank 1000 [size] [--time-budget SECONDS] [--no-unique]
+Puzzles are uniquely solvable unless --no-unique is given (the game scores a board against
+the stored solution, so a puzzle with several solutions can mark a correct board as lost).
+Puzzles equivalent to one already in the bank are skipped; the canonical forms of stored
+puzzles are kept in puzzles.bank.idx
+'''
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or extend a puzzle bank file.')
+    parser.add_argument('path', help='bank file to create or extend')
+    parser.add_argument('count', type=int, help='puzzles to generate per difficulty level')
+    parser.add_argument('size', type=int, nargs='?', default=9, help='rows/columns of the boards (default: 9)')
+    parser.add_argument('--unique', action=argparse.BooleanOptionalAction, default=True,
+                        help='only store uniquely solvable puzzles (default: on)')
+    parser.add_argument('--time-budget', type=float, default=UNIQUE_TIME_BUDGET,
+                        help=f'seconds of unique removal allowed per puzzle (default: {UNIQUE_TIME_BUDGET})')
+    args = parser.parse_args()
+    size = args.size
+    with PuzzleIndex(args.path + '.idx') as index:
+        for difficulty, removed in difficulty_levels.items():
+            removed = removed * size * size // 81
+            batch = generate_sudoku_batch(size, removed, args.count, unique=args.unique, time_budget=args.time_budget)
+            added = append_puzzles(args.path, difficulty, unique_puzzles(batch, index))
+            print(f'{difficulty}: added {added} puzzles')
+        print(f'skipped {index.rejected} duplicates')
@@ -0,0 +1,243 @@
+import argparse,json,os,platform,random,sys,time
+from sudoku_board import SudokuBoard, unflatten
+from sudoku_cli import decode_cells
+from sudoku_generator import SudokuGenerator, difficulty_levels, generate_sudoku
+from sudoku_solver import ENGINES
+
+"""
+Benchmarks for generation, solving, board checks and headless rendering.
+
+python3 sudoku_bench.py --output bench.json
+python3 sudoku_bench.py --baseline bench.json --threshold 0.25
+
+Every result is a time in seconds (lower is better), so a run can be compared against a
+stored baseline metric by metric: a metric slower than baseline * (1 + threshold) is a
+regression, and the exit status is 1 if there are any. Random work is seeded, so runs
+measure the same puzzles every time.
+
+bench_baseline.json is a reference run (its 'meta' records the Python version and platform).
+Timings only compare on the same machine, so before checking a change, write a baseline of
+your own from the unchanged tree with --output, then run the changed tree with --baseline.
+Refresh bench_baseline.json with --output bench_baseline.json when a change is meant to
+move the numbers.
+
+"""
+
+NOISE_FLOOR = 1e-6  # slowdowns smaller than this many seconds are timer noise, never regressions
+
+# fixed corpus of hard 9x9 puzzles, each with a unique solution
+HARD_PUZZLES = {
+    'inkala_2012': '8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4..',
+    'ai_escargot': '1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..',
+    'easter_monster': '1.......2.9.4...5...6...7...5.9.3.......7.......85..4.7.....6...3...9.8...2.....1',
+    'norvig_hardest': '4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......',
+    'hard_5': '..1..4.......6.3.5...9.....8.....7.3.......285...7.6..3...8...6..92......4...1...',
+}
+
+'''
+Returns percentile q (0..1) of a list of timings
+'''
+def percentile(times, q):
+    ordered = sorted(times)
+    return ordered[int(q * (len(ordered) - 1))]
+
+'''
+Calls fn repeat times and returns the list of wall times
+'''
+def timings(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+'''
+Runs fn in a loop of number calls, repeat times, and returns the best time per call
+(the usual timeit approach for operations too quick to time one call at a time)
+'''
+def per_call(fn, number, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+'''
+generate_sudoku latency per difficulty: p50, p90, p99 and mean over seeded runs
+'''
+def bench_generate(repeat):
+    results = {}
+    for difficulty, removed in difficulty_levels.items():
+        random.seed(0)
+        times = timings(lambda: generate_sudoku(9, removed), repeat)
+        results[f'generate.{difficulty}.p50'] = percentile(times, 0.5)
+        results[f'generate.{difficulty}.p90'] = percentile(times, 0.9)
+        results[f'generate.{difficulty}.p99'] = percentile(times, 0.99)
+        results[f'generate.{difficulty}.mean'] = sum(times) / len(times)
+    return results
+
+'''
+Seconds per solved grid for each way of filling a board
+'''
+def bench_fill(repeat):
+    results = {}
+    for name, options in (('fill_remaining', {}), ('mrv', {'mrv': True}), ('dlx', {'engine': 'dlx'}),
+                          ('derive', {'derive': True})):
+        random.seed(0)
+        times = timings(lambda: SudokuGenerator(9, 0, **options).fill_values(), repeat)
+        results[f'fill.{name}.mean'] = sum(times) / len(times)
+    return results
+
+'''
+Seconds to prove each corpus puzzle has a unique solution, per engine
+'''
+def bench_solver(repeat):
+    results = {}
+    for name, engine in ENGINES.items():
+        total = 0.0
+        for puzzle_name, text in HARD_PUZZLES.items():
+            board = unflatten(decode_cells(text), 9)
+            best = min(timings(lambda: engine.count(board, 2), max(1, repeat // 10)))
+            results[f'solve.{name}.{puzzle_name}'] = best
+            total += best
+        results[f'solve.{name}.corpus'] = total
+    return results
+
+'''
+Seconds per call of the SudokuBoard checks, on a board one move from solved
+'''
+def bench_board(repeat):
+    random.seed(0)
+    puzzle, solution = generate_sudoku(9, difficulty_levels['medium'])
+    board = SudokuBoard(9)
+    board.load(puzzle, solution)
+    row, col = board.find_empty()
+    for i in range(81):
+        board.set_value(i // 9, i % 9, solution[i // 9][i % 9])
+    board.set_value(row, col, 0)
+    number = max(1000, repeat * 100)
+    return {
+        'board.check_board': per_call(board.check_board, number),
+        'board.is_full': per_call(board.is_full, number),
+        'board.has_conflicts': per_call(board.has_conflicts, number),
+        'board.set_value': per_call(lambda: (board.set_value(row, col, solution[row][col]), board.set_value(row, col, 0)), number) / 2,
+    }
+
+'''
+Board.draw frame times under SDL's dummy video driver: a full repaint and a
+one-cell update (place a number, redraw the dirty cell)
+'''
+def bench_draw(repeat):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    import sudoku_gui
+    pygame.display.init()
+    try:
+        screen = pygame.display.set_mode((sudoku_gui.WINDOW_WIDTH, sudoku_gui.WINDOW_HEIGHT))
+        random.seed(0)
+        puzzle, solution = generate_sudoku(9, difficulty_levels['medium'])
+        board = sudoku_gui.Board(screen, 'medium')
+        board.model.load(puzzle, solution)
+        sudoku_gui.RENDER_CACHE.prerender_digits()
+        row, col = board.find_empty()
+        board.select(row, col)
+        board.draw()
+
+        def full():
+            board.full_redraw = True
+            board.draw()
+
+        values = [solution[row][col], 0]
+
+        def update():
+            values.reverse()
+            board.place_number(values[0])
+            board.draw()
+
+        full_times = timings(full, repeat)
+        update_times = timings(update, repeat * 10)
+        return {
+            'draw.full.p50': percentile(full_times, 0.5),
+            'draw.full.p99': percentile(full_times, 0.99),
+            'draw.update.p50': percentile(update_times, 0.5),
+            'draw.update.p99': percentile(update_times, 0.99),
+        }
+    finally:
+        pygame.quit()
+
+BENCHMARKS = {
+    'generate': bench_generate,
+    'fill': bench_fill,
+    'solver': bench_solver,
+    'board': bench_board,
+    'draw': bench_draw,
+}
+
+'''
+Compares results against a baseline
+
+Parameters:
+results and baseline are dicts of metric -> seconds
+threshold is the allowed slowdown as a fraction (0.25 allows 25% slower); metrics that
+slowed down by less than NOISE_FLOOR seconds are not counted whatever their ratio
+
+Return: list of (metric, baseline seconds, seconds, ratio) for every metric in both, and a
+list of the metrics among them that regressed
+'''
+def compare(results, baseline, threshold):
+    rows = []
+    regressions = []
+    for metric, seconds in results.items():
+        if metric not in baseline or not baseline[metric]:
+            continue
+        ratio = seconds / baseline[metric]
+        rows.append((metric, baseline[metric], seconds, ratio))
+        if ratio > 1 + threshold and seconds - baseline[metric] > NOISE_FLOOR:
+            regressions.append(metric)
+    return rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark generation, solving, board checks and rendering.')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='run only these benchmark groups')
+    parser.add_argument('--repeat', type=int, default=50, help='samples per latency distribution')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results stored by an earlier --output')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before a metric counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        start = time.perf_counter()
+        results.update(BENCHMARKS[name](args.repeat))
+        print(f'{name}: {time.perf_counter() - start:.1f}s', file=sys.stderr)
+    for metric, seconds in results.items():
+        print(f'{metric:40} {seconds * 1000:10.3f} ms')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                         'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'repeat': args.repeat},
+                'results': results,
+            }, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f'\ncompared with {args.baseline} (threshold {args.threshold:.0%}):')
+        for metric, before, after, ratio in rows:
+            flag = '  REGRESSION' if metric in regressions else ''
+            print(f'{metric:40} {before * 1000:10.3f} -> {after * 1000:10.3f} ms  x{ratio:.2f}{flag}')
+        if regressions:
+            print(f'{len(regressions)} regression(s)', file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import math
+
+"""
+Pure-Python board model for a game in progress: cell values, which cells were given,
+sketches, conflict tracking and solution checking. It has no pygame dependency, so
+headless tools can use it directly; sudoku_gui wraps it for drawing.
+
+Cells are stored in flat bytearrays indexed by row * size + col, the same layout as
+SudokuGenerator.cells, so snapshots are plain slice copies.
+
+"""
+
+'''
+Converts a 2D list board into a flat bytearray (one byte per cell, row by row)
+Values must fit in a byte, which holds for every supported board size
+
+Parameters:
+grid is a 2D list of ints
+
+Return: bytearray
+'''
+def flatten(grid):
+    return bytearray(value for row in grid for value in row)
+
+'''
+Converts flat cells (bytes, bytearray or list) back into a 2D list board
+
+Parameters:
+cells is the flat board, index row * size + col
+size is the number of rows/columns of the board
+
+Return: list[list]
+'''
+def unflatten(cells, size):
+    return [list(cells[row * size:(row + 1) * size]) for row in range(size)]
+
+'''
+Returns (and caches) the peers of every cell for a board size: for each cell index,
+the indices of all other cells in the same row, column or box
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return: list of tuples of ints
+'''
+peer_cache = {}
+
+def get_peers(size):
+    if size in peer_cache:
+        return peer_cache[size]
+    box_length = int(math.sqrt(size))
+    peers = []
+    for row in range(size):
+        for col in range(size):
+            box_row, box_col = row - row % box_length, col - col % box_length
+            cells = {row * size + j for j in range(size)}
+            cells |= {i * size + col for i in range(size)}
+            cells |= {i * size + j for i in range(box_row, box_row + box_length) for j in range(box_col, box_col + box_length)}
+            cells.discard(row * size + col)
+            peers.append(tuple(sorted(cells)))
+    peer_cache[size] = peers
+    return peers
+
+'''
+The state of one game: values, given cells, sketches and the running counts that make
+is_full, check_board and conflict lookups O(1)
+
+self.size			- the number of rows/columns of the board
+self.box_length		- the square root of size
+self.values			- flat bytearray of cell values (0 for empty)
+self.initial		- flat bytearray, 1 for the puzzle's given cells
+self.sketches		- flat bytearray of sketched values (0 for none)
+self.conflicts		- flat bytearray, 1 when a value clashes with a peer
+self.solution_cells	- the solution as flat bytes (None until load; self.solution gives it as a 2D list)
+self.filled			- number of non-empty cells
+self.mismatches		- number of cells whose value differs from the solution
+self.row_counts		- row_counts[row][value] is how many times value appears in row
+self.col_counts		- same for columns
+self.box_counts		- same for boxes (numbered left to right, top to bottom)
+self.changed		- indices of cells whose value, sketch or conflict flag changed since pop_changed
+'''
+class SudokuBoard:
+    def __init__(self, size=9):
+        self.size = size
+        self.box_length = int(math.sqrt(size))
+        self.peers = get_peers(size)
+        cells = size * size
+        self.values = bytearray(cells)
+        self.initial = bytearray(cells)
+        self.sketches = bytearray(cells)
+        self.conflicts = bytearray(cells)
+        self.solution_cells = None
+        self.filled = 0
+        self.mismatches = cells
+        self.row_counts = [[0] * (size + 1) for _ in range(size)]
+        self.col_counts = [[0] * (size + 1) for _ in range(size)]
+        self.box_counts = [[0] * (size + 1) for _ in range(size)]
+        self.changed = set()
+
+    def index(self, row, col):
+        return row * self.size + col
+
+    def box_index(self, row, col):
+        return (row // self.box_length) * self.box_length + col // self.box_length
+
+    @property
+    def solution(self):
+        if self.solution_cells is None:
+            return None
+        return unflatten(self.solution_cells, self.size)
+
+    '''
+    Starts a new game from a (puzzle, solution) pair as returned by generate_sudoku
+
+	Parameters:
+	puzzle is a 2D list of ints (0 for empty)
+	solution is the solved 2D list of ints
+
+	Return: None
+    '''
+    def load(self, puzzle, solution):
+        self.load_flat(flatten(puzzle), flatten(solution))
+
+    '''
+    Starts a new game from flat cells, as returned by generate_sudoku_flat
+
+	Parameters:
+	puzzle is the flat puzzle (bytes, bytearray or list; 0 for empty)
+	solution is the flat solution
+
+	Return: None
+    '''
+    def load_flat(self, puzzle, solution):
+        cells = self.size * self.size
+        self.solution_cells = bytes(solution)
+        self.values = bytearray(puzzle)
+        self.initial = bytearray(value != 0 for value in self.values)
+        self.sketches = bytearray(cells)
+        self.rebuild_counts()
+        self.changed = set(range(cells))
+
+    '''
+    Recomputes the filled/mismatch/digit counts and conflict flags from scratch
+    '''
+    def rebuild_counts(self):
+        size = self.size
+        self.filled = 0
+        self.mismatches = 0
+        self.row_counts = [[0] * (size + 1) for _ in range(size)]
+        self.col_counts = [[0] * (size + 1) for _ in range(size)]
+        self.box_counts = [[0] * (size + 1) for _ in range(size)]
+        for i, value in enumerate(self.values):
+            row, col = divmod(i, size)
+            if value != 0:
+                self.filled += 1
+                self.row_counts[row][value] += 1
+                self.col_counts[col][value] += 1
+                self.box_counts[self.box_index(row, col)][value] += 1
+            if self.solution_cells is None or value != self.solution_cells[i]:
+                self.mismatches += 1
+        self.conflicts = bytearray(self.is_conflict(i) for i in range(size * size))
+
+    '''
+    Returns True if the value at cell index i appears again in its row, column or box
+    '''
+    def is_conflict(self, i):
+        value = self.values[i]
+        if value == 0:
+            return False
+        row, col = divmod(i, self.size)
+        return (self.row_counts[row][value] > 1 or self.col_counts[col][value] > 1
+                or self.box_counts[self.box_index(row, col)][value] > 1)
+
+    '''
+    Sets the value of (row, col), keeping every count and conflict flag current
+    Given cells cannot be changed
+
+	Parameters:
+	row and col are the row index and col index of the cell
+	value is the new value (0 to clear)
+
+	Return: boolean (whether the value changed)
+    '''
+    def set_value(self, row, col, value):
+        i = row * self.size + col
+        old = self.values[i]
+        if self.initial[i] or value == old:
+            return False
+        self.values[i] = value
+        box = self.box_index(row, col)
+        if old != 0:
+            self.filled -= 1
+            self.row_counts[row][old] -= 1
+            self.col_counts[col][old] -= 1
+            self.box_counts[box][old] -= 1
+        if value != 0:
+            self.filled += 1
+            self.row_counts[row][value] += 1
+            self.col_counts[col][value] += 1
+            self.box_counts[box][value] += 1
+        if self.solution_cells is not None:
+            answer = self.solution_cells[i]
+            self.mismatches += (value != answer) - (old != answer)
+
+        # only peers holding the old or new digit can change conflict state
+        self.changed.add(i)
+        self.conflicts[i] = self.is_conflict(i)
+        for peer in self.peers[i]:
+            peer_value = self.values[peer]
+            if peer_value != 0 and (peer_value == old or peer_value == value):
+                conflict = self.is_conflict(peer)
+                if conflict != bool(self.conflicts[peer]):
+                    self.conflicts[peer] = conflict
+                    self.changed.add(peer)
+        return True
+
+    '''
+    Sets the sketched value of (row, col); given cells cannot be sketched
+
+	Return: boolean (whether the sketch changed)
+    '''
+    def set_sketch(self, row, col, value):
+        i = row * self.size + col
+        if self.initial[i] or value == self.sketches[i]:
+            return False
+        self.sketches[i] = value
+        self.changed.add(i)
+        return True
+
+    '''
+    Clears every cell that was not part of the original puzzle
+    '''
+    def reset_to_original(self):
+        for i, value in enumerate(self.values):
+            if value != 0 and not self.initial[i]:
+                self.set_value(i // self.size, i % self.size, 0)
+
+    def is_full(self):
+        return self.filled == self.size * self.size
+
+    '''
+    Returns True if the current values match the stored solution
+    '''
+    def check_board(self):
+        return self.mismatches == 0
+
+    '''
+    Returns True if any row, column or box holds the same digit twice
+    '''
+    def has_conflicts(self):
+        return any(self.conflicts)
+
+    '''
+    Returns (row, col) of the first empty cell, or None if the board is full
+    '''
+    def find_empty(self):
+        if self.is_full():
+            return None
+        i = self.values.index(0)
+        return divmod(i, self.size)
+
+    '''
+    Returns the current values as a 2D list, like generate_sudoku's boards
+    '''
+    def to_grid(self):
+        return unflatten(self.values, self.size)
+
+    '''
+    Returns a snapshot of the current values as flat bytes (a slice copy)
+    '''
+    def snapshot(self):
+        return bytes(self.values)
+
+    '''
+    Returns and forgets the indices of cells that changed since the last call
+    '''
+    def pop_changed(self):
+        changed = self.changed
+        self.changed = set()
+        return changed
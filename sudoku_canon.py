@@ -0,0 +1,239 @@
+import hashlib,math,os
+from itertools import permutations, product
+from operator import itemgetter
+from sudoku_board import flatten
+
+"""
+Canonical forms of puzzles, and an on-disk index of them for rejecting duplicates.
+
+Two puzzles are equivalent when one can be turned into the other by relabelling digits,
+permuting rows within a band, columns within a stack, bands, stacks, and transposing.
+canonical_form picks one representative per equivalence class: among the arrangements
+that start with a suitable first row (see first_row_rank) with its givens packed to the
+left, the one whose rows, read in order with digits relabelled by first appearance, are
+lexicographically smallest (given cells sort before empty ones).
+
+The first row fixes the column order; the search then extends the row order one row at a
+time, keeping only the arrangements that tie for the smallest prefix.
+
+"""
+
+EMPTY_KEY = 255  # sort key of an empty cell, after every digit label
+
+'''
+Returns every column order that packs a row's givens as far left as possible:
+stacks with more givens first, and within each stack the given columns first
+
+Parameters:
+row is the list of the row's values (0 for empty)
+box_length is the square root of the board size
+
+Return: list of tuples of column indices
+'''
+def best_column_orders(row, box_length):
+    stacks = []
+    for start in range(0, len(row), box_length):
+        cols = range(start, start + box_length)
+        given = [col for col in cols if row[col]]
+        empty = [col for col in cols if not row[col]]
+        stacks.append((len(given), [g + e for g in permutations(given) for e in permutations(empty)]))
+
+    # stacks with the same number of givens may come in any order
+    groups = {}
+    for count, orders in stacks:
+        groups.setdefault(count, []).append(orders)
+    stack_orders = [[]]
+    for count in sorted(groups, reverse=True):
+        stack_orders = [prefix + list(order) for prefix in stack_orders for order in permutations(groups[count])]
+
+    column_orders = []
+    for stack_order in stack_orders:
+        for inner in product(*stack_order):
+            column_orders.append(sum(inner, ()))
+    return column_orders
+
+'''
+Returns how a row ranks as a first row: the number of column orders that pack it equally
+well, then its stack given counts (largest first, negated so that more givens rank first)
+
+Return: tuple
+'''
+def first_row_rank(row, box_length):
+    counts = []
+    orders = 1
+    for start in range(0, len(row), box_length):
+        given = box_length - row[start:start + box_length].count(0)
+        counts.append(given)
+        orders *= math.factorial(given) * math.factorial(box_length - given)
+    for count in set(counts):
+        orders *= math.factorial(counts.count(count))
+    return (orders, sorted((-count for count in counts)))
+
+'''
+Returns the sort key of a row whose values were already put in column order, relabelling
+digits by first appearance
+labels is a 256-byte translation table (digit -> label, 0 for not yet seen, and 0 -> EMPTY_KEY)
+and is updated in place; count is the number of labels handed out so far
+
+Return: (bytes, count)
+'''
+def row_key(values, labels, count):
+    for value in values:
+        if value and not labels[value]:
+            count += 1
+            labels[value] = count
+    return bytes(values).translate(labels), count
+
+'''
+Returns the canonical representative of a puzzle (see the module notes)
+Equivalent puzzles, and only those, have the same canonical form
+
+Parameters:
+board is the puzzle as a 2D list or flat cells (0 for empty)
+
+Return: bytes (flat cells of the representative, 0 for empty)
+'''
+def canonical_form(board):
+    cells = board if isinstance(board, (bytes, bytearray)) else flatten(board)
+    size = int(math.sqrt(len(cells)))
+    box_length = int(math.sqrt(size))
+    cells = bytes(cells)
+    rows = [cells[row * size:(row + 1) * size] for row in range(size)]
+    grids = [rows, [bytes(row[col] for row in rows) for col in range(size)]]
+
+    # the first row: the row (of either grid) whose packed column orders are fewest, then the
+    # most tightly packed; this choice is invariant under the symmetries, and keeps full or
+    # empty rows, which every column order packs equally well, from coming first
+    best = None
+    states = []
+    for grid in grids:
+        for first in range(size):
+            choice = first_row_rank(grid[first], box_length)
+            if best is None or choice < best:
+                best = choice
+                states = []
+            if choice == best:
+                states.append((grid, first))
+    candidates = []
+    for grid, first in states:
+        for columns in best_column_orders(grid[first], box_length):
+            order = itemgetter(*columns)
+            labels = bytearray(256)
+            labels[0] = EMPTY_KEY
+            key, count = row_key(order(grid[first]), labels, 0)
+            candidates.append((grid, (first,), columns, order, labels, count))
+    form = [key]
+
+    for position in range(1, size):
+        best = None
+        extended = {}
+        for grid, used, columns, order, labels, count in candidates:
+            if position % box_length:
+                band = used[-1] // box_length * box_length
+                options = [row for row in range(band, band + box_length) if row not in used]
+            else:
+                bands = {row // box_length for row in used}
+                options = [row for row in range(size) if row // box_length not in bands]
+            for row in options:
+                row_labels = bytearray(labels)
+                key, row_count = row_key(order(grid[row]), row_labels, count)
+                if best is None or key < best:
+                    best = key
+                    extended = {}
+                if key == best:
+                    # candidates that used the same rows in another order continue identically
+                    state = (id(grid), frozenset(used), row, columns, bytes(row_labels))
+                    extended[state] = (grid, used + (row,), columns, order, row_labels, row_count)
+        candidates = extended.values()
+        form.append(best)
+    return b''.join(form).replace(bytes([EMPTY_KEY]), b'\0')
+
+'''
+Returns a short hash of a puzzle's canonical form, the key used by PuzzleIndex
+
+Return: bytes (16 bytes)
+'''
+def canonical_key(board):
+    return hashlib.blake2b(canonical_form(board), digest_size=16).digest()
+
+'''
+Persistent set of canonical keys, for rejecting puzzles equivalent to ones already seen
+The file is a magic header followed by 16-byte keys; it is read into a set once on open,
+and new keys are appended, so lookups and additions are O(1)
+
+self.path		- the index file path
+self.keys		- set of canonical keys
+self.added		- keys added since the index was opened
+self.rejected	- puzzles rejected as duplicates since the index was opened
+'''
+INDEX_MAGIC = b'SDKI\x01\x00\x00\x00'
+KEY_SIZE = 16
+
+class PuzzleIndex:
+    def __init__(self, path):
+        self.path = path
+        self.keys = set()
+        self.added = 0
+        self.rejected = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                raise ValueError(f'{path} is not a puzzle index')
+            data = memoryview(data)[len(INDEX_MAGIC):]
+            usable = len(data) - len(data) % KEY_SIZE  # ignore a torn final write
+            self.keys = {bytes(data[i:i + KEY_SIZE]) for i in range(0, usable, KEY_SIZE)}
+            self.file = open(path, 'r+b')
+            self.file.seek(len(INDEX_MAGIC) + usable)
+            self.file.truncate()
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(INDEX_MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, board):
+        return canonical_key(board) in self.keys
+
+    '''
+    Adds a puzzle to the index unless an equivalent puzzle is already there
+
+	Parameters:
+	board is the puzzle as a 2D list or flat cells
+
+	Return: boolean (True if the puzzle was new)
+    '''
+    def add(self, board):
+        key = canonical_key(board)
+        if key in self.keys:
+            self.rejected += 1
+            return False
+        self.keys.add(key)
+        self.file.write(key)
+        self.added += 1
+        return True
+
+'''
+Filters (board, solution) pairs, e.g. from generate_sudoku_batch, down to the puzzles
+not yet in index, recording each new one as it passes
+
+Parameters:
+puzzles is an iterable of (board, solution) pairs (2D lists or flat cells)
+index is a PuzzleIndex
+
+Return: generator of (board, solution)
+'''
+def unique_puzzles(puzzles, index):
+    for board, solution in puzzles:
+        if index.add(board):
+            yield board, solution
@@ -0,0 +1,185 @@
+import argparse,json,math,multiprocessing,os,sys,time
+from sudoku_board import unflatten
+from sudoku_generator import GenerationStats, difficulty_levels, generate_sudoku_batch
+from sudoku_solver import solve_and_count
+
+"""
+Command-line puzzle generation and solving, with no display needed.
+
+python3 sudoku_cli.py --count 1000 --difficulty hard --workers 4 --seed 1 > puzzles.jsonl
+python3 sudoku_cli.py --solve --format line < puzzles.txt
+
+Puzzles are written one per line as soon as they are ready, either as JSON objects
+(--format jsonl) or as one character per cell (--format line: '.' for empty, then
+1-9 and A-P for values above 9, so 81 characters for 9x9). Throughput goes to stderr.
+
+"""
+
+CELL_CHARS = '.123456789ABCDEFGHIJKLMNOP'
+ENCODE_TABLE = bytes.maketrans(bytes(range(len(CELL_CHARS))), CELL_CHARS.encode())
+CELL_VALUES = {char: value for value, char in enumerate(CELL_CHARS)}
+CELL_VALUES.update({'0': 0, '_': 0})
+CELL_VALUES.update({char.lower(): value for char, value in CELL_VALUES.items() if char.isalpha()})
+STATS_INTERVAL = 2.0  # seconds between progress lines on stderr
+
+'''
+Returns flat cells (bytes) as a line of cell characters
+'''
+def encode_cells(cells):
+    return bytes(cells).translate(ENCODE_TABLE).decode()
+
+'''
+Parses a line of cell characters into flat cells
+Raises ValueError if the line is not a square board of known characters
+
+Return: bytes
+'''
+def decode_cells(text):
+    try:
+        cells = bytes(CELL_VALUES[char] for char in text)
+    except KeyError as e:
+        raise ValueError(f'unexpected cell character {e.args[0]!r}') from None
+    size = math.isqrt(len(cells))
+    if size * size != len(cells) or math.isqrt(size) ** 2 != size:
+        raise ValueError(f'{len(cells)} cells is not a sudoku board')
+    return cells
+
+'''
+Prints progress to stderr every STATS_INTERVAL seconds, and a summary at the end
+
+self.label	- what is being counted, e.g. 'generated'
+self.count	- items done so far
+self.start	- time.perf_counter() at creation
+'''
+class Throughput:
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def tick(self):
+        self.count += 1
+        now = time.perf_counter()
+        if now - self.last_report >= STATS_INTERVAL:
+            self.last_report = now
+            self.report(now)
+
+    def report(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        print(f'{self.label} {self.count} in {elapsed:.2f}s ({rate:.1f}/s)', file=sys.stderr, flush=True)
+
+'''
+Writes one output line to stdout and flushes it, so readers see each puzzle as soon as it is ready
+'''
+def write_line(line):
+    sys.stdout.write(line + '\n')
+    sys.stdout.flush()
+
+'''
+Generates puzzles and streams them to stdout
+'''
+def run_generate(args):
+    removed = difficulty_levels[args.difficulty] * args.size * args.size // 81
+    stats = Throughput('generated')
+    search_stats = GenerationStats() if args.stats else None
+    puzzles = generate_sudoku_batch(args.size, removed, args.count, workers=args.workers, seed=args.seed,
+                                    unique=args.unique, time_budget=args.time_budget, flat=True, stats=search_stats)
+    try:
+        for board, solution in puzzles:
+            if args.format == 'line':
+                write_line(encode_cells(board))
+            else:
+                write_line(json.dumps({'puzzle': encode_cells(board), 'solution': encode_cells(solution),
+                                       'difficulty': args.difficulty}))
+            stats.tick()
+    finally:
+        puzzles.close()
+    stats.report()
+    if search_stats is not None:
+        print(search_stats, file=sys.stderr)
+
+'''
+Solves one input line inside a worker process
+JSON lines must have a 'puzzle' field; any other line is read as cell characters
+
+Return: (puzzle, solution, solutions, error) - solution is None if unsolvable,
+solutions is 1, or 2 when the puzzle has more than one solution
+'''
+def solve_line(line):
+    try:
+        text = json.loads(line)['puzzle'] if line.startswith('{') else line
+        cells = decode_cells(text)
+    except (ValueError, KeyError, TypeError) as e:
+        return None, None, 0, str(e)
+    size = math.isqrt(len(cells))
+    # one search both finds the first solution and looks for a second
+    solutions, solution = solve_and_count(unflatten(cells, size), 2)
+    if not solutions:
+        return cells, None, 0, None
+    return cells, bytes(value for row in solution for value in row), solutions, None
+
+'''
+Reads puzzles from stdin and streams their solutions to stdout, in input order
+Unreadable or unsolvable puzzles give an empty line in line format, and a null
+solution (with an 'error' for unreadable ones) in jsonl
+'''
+def run_solve(args):
+    lines = (line.strip() for line in sys.stdin)
+    lines = (line for line in lines if line)
+    stats = Throughput('solved')
+    workers = args.workers if args.workers is not None else multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap(solve_line, lines, chunksize=8) if pool else map(solve_line, lines)
+        for puzzle, solution, solutions, error in results:
+            if args.format == 'line':
+                write_line(encode_cells(solution) if solution is not None else '')
+            else:
+                record = {
+                    'puzzle': encode_cells(puzzle) if puzzle is not None else None,
+                    'solution': encode_cells(solution) if solution is not None else None,
+                    'solutions': solutions,
+                }
+                if error is not None:
+                    record['error'] = error
+                write_line(json.dumps(record))
+            stats.tick()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    stats.report()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate or solve sudoku puzzles without a display.')
+    parser.add_argument('--count', type=int, default=1, help='number of puzzles to generate')
+    parser.add_argument('--difficulty', choices=list(difficulty_levels), default='medium')
+    parser.add_argument('--size', type=int, default=9, help='rows/columns of the board (9, 16 or 25)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU; 1 runs in-process)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for a reproducible batch')
+    parser.add_argument('--unique', action='store_true', help='only generate uniquely solvable puzzles')
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds allowed per puzzle for --unique')
+    parser.add_argument('--format', choices=['jsonl', 'line'], default='jsonl')
+    parser.add_argument('--stats', action='store_true', help='print search counters and phase timings to stderr')
+    parser.add_argument('--solve', action='store_true', help='solve puzzles read from stdin instead of generating')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        if args.solve:
+            run_solve(args)
+        else:
+            run_generate(args)
+    except BrokenPipeError:
+        # the reader went away (e.g. piped into head); stop quietly, and keep the
+        # interpreter from failing again when it flushes stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
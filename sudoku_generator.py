@@ -1,4 +1,7 @@
-import math,random,copy
+import math,random,time,os
+import multiprocessing
+from sudoku_board import unflatten
+from sudoku_solver import ENGINES, default_engine
 
 """
 This was adapted from a GeeksforGeeks article "Program for Sudoku Generator" by Aarti_Rathi and Ankur Trisal
@@ -6,36 +9,230 @@ https://www.geeksforgeeks.org/program-sudoku-generator/
 
 """
 
+# number of cells removed from a 9x9 board at each difficulty (scale by size*size/81 for larger boards)
+difficulty_levels = {
+    'easy': 30,
+    'medium': 40,
+    'hard': 50
+}
+
+'''
+One row of a SudokuGenerator's board, read and written through to its flat cells
+'''
+class BoardRow:
+    __slots__ = ('generator', 'row')
+
+    def __init__(self, generator, row):
+        self.generator = generator
+        self.row = row
+
+    def __len__(self):
+        return self.generator.row_length
+
+    def __getitem__(self, col):
+        start = self.row * self.generator.row_length
+        if isinstance(col, slice):
+            return list(self.generator.cells[start:start + self.generator.row_length][col])
+        return self.generator.cells[start + range(self.generator.row_length)[col]]
+
+    def __setitem__(self, col, num):
+        col = range(self.generator.row_length)[col]
+        self.generator.clear_value(self.row, col)
+        if num != 0:
+            self.generator.place_value(self.row, col, num)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __eq__(self, other):
+        return self[:] == list(other)
+
+    def __repr__(self):
+        return repr(self[:])
+
+'''
+The 2D view returned by SudokuGenerator.board: view[row] is a BoardRow
+'''
+class BoardView:
+    __slots__ = ('generator',)
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def __len__(self):
+        return self.generator.row_length
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [BoardRow(self.generator, i) for i in range(self.generator.row_length)[row]]
+        return BoardRow(self.generator, range(self.generator.row_length)[row])
+
+    def __iter__(self):
+        return (BoardRow(self.generator, row) for row in range(self.generator.row_length))
+
+    def __eq__(self, other):
+        return self.generator.get_board() == [list(row) for row in other]
+
+    def __repr__(self):
+        return repr(self.generator.get_board())
+
 class SudokuGenerator:
     '''
 	create a sudoku board - initialize class variables and set up the 2D board
 	This should initialize:
 	self.row_length		- the length of each row
 	self.removed_cells	- the total number of cells to be removed
-	self.board			- a 2D list of ints to represent the board
+	self.cells			- the board as a flat bytearray, index row * row_length + col
+	self.board			- a live 2D view of self.cells (see BoardView); get_board returns a copy
 	self.box_length		- the square root of row_length
+	self.row_masks		- one bitmask per row, bit num set when num is used in that row
+	self.col_masks		- one bitmask per column, same layout as row_masks
+	self.box_masks		- one bitmask per box, boxes numbered left to right, top to bottom
+	self.mrv			- whether fill_values uses minimum-remaining-values cell ordering
+	self.unique			- whether remove_cells must leave a puzzle with exactly one solution
+	self.time_budget	- seconds remove_cells may spend keeping the puzzle unique (None for no limit)
+	self.engine			- the solving engine (see sudoku_solver.ENGINES) used to fill and count solutions
+	self.derive			- a SolutionPool to derive solutions from instead of filling (or None)
+	self.stats			- a GenerationStats to record search counters and phase timings in (or None)
 
 	Parameters:
-    row_length is the number of rows/columns of the board (always 9 for this project)
+    row_length is the number of rows/columns of the board (9, 16 or 25 - any perfect square)
     removed_cells is an integer value - the number of cells to be removed
+    mrv is an optional boolean - fill the board most-constrained cell first
+    (off by default so a given random seed always produces the same board)
+    unique is an optional boolean - only remove cells that keep the solution unique
+    time_budget is an optional number of seconds - caps the time spent on unique removal
+    engine is an optional engine name ('backtrack' or 'dlx'); by default 9x9 boards keep the
+    original fill_remaining backtracking and larger boards use exact cover ('dlx')
+    derive is an optional boolean or SolutionPool - take the solution from a pool of seed grids
+    transformed by random symmetries instead of filling from scratch (True uses the shared
+    pool for this board size, see get_solution_pool)
+    stats is an optional GenerationStats - record counters and timings into it (off by default;
+    when off the search runs exactly as without it)
 
 	Return:
 	None
     '''
-    def __init__(self, row_length, removed_cells):
+    def __init__(self, row_length, removed_cells, mrv=False, unique=False, time_budget=None, engine=None, derive=False, stats=None):
         self.row_length = row_length
         self.removed_cells = removed_cells
-        self.board = [[0 for _ in range(row_length)] for _ in range(row_length)]
+        self.cells = bytearray(row_length * row_length)
         self.box_length = int(math.sqrt(row_length))
+        self.row_masks = [0] * row_length
+        self.col_masks = [0] * row_length
+        self.box_masks = [0] * row_length
+        self.mrv = mrv
+        self.unique = unique
+        self.time_budget = time_budget
+        self.engine = ENGINES[engine] if engine is not None else default_engine(row_length)
+        self.derive = get_solution_pool(row_length) if derive is True else (derive or None)
+        self.stats = stats
+
+    '''
+    Returns the index of the box containing (row, col)
+    Boxes are numbered left to right, top to bottom starting at 0
+
+	Parameters:
+	row and col are the row index and col index of the cell
+
+	Return: int
+    '''
+    def box_index(self, row, col):
+        return (row // self.box_length) * self.box_length + col // self.box_length
+
+    '''
+    Writes num into (row, col) and marks it as used in that cell's row, column and box
+    The cell must be empty (0) before calling this
+
+	Parameters:
+	row and col are the row index and col index of the cell
+	num is the value to place
+
+	Return: None
+    '''
+    def place_value(self, row, col, num):
+        bit = 1 << num
+        self.cells[row * self.row_length + col] = num
+        self.row_masks[row] |= bit
+        self.col_masks[col] |= bit
+        self.box_masks[self.box_index(row, col)] |= bit
+
+    '''
+    Empties (row, col) and releases its value from that cell's row, column and box
+    Does nothing if the cell is already empty
+
+	Parameters:
+	row and col are the row index and col index of the cell
+
+	Return: None
+    '''
+    def clear_value(self, row, col):
+        num = self.cells[row * self.row_length + col]
+        if num == 0:
+            return
+        bit = ~(1 << num)
+        self.cells[row * self.row_length + col] = 0
+        self.row_masks[row] &= bit
+        self.col_masks[col] &= bit
+        self.box_masks[self.box_index(row, col)] &= bit
+
+    '''
+    Recomputes the row, column and box bitmasks from self.cells
+    Only needed if self.cells was modified directly instead of through place_value/clear_value
+
+	Parameters: None
+	Return: None
+    '''
+    def rebuild_masks(self):
+        self.row_masks = [0] * self.row_length
+        self.col_masks = [0] * self.row_length
+        self.box_masks = [0] * self.row_length
+        for i, num in enumerate(self.cells):
+            if num != 0:
+                self.cells[i] = 0
+                self.place_value(i // self.row_length, i % self.row_length, num)
+
+    '''
+    Returns a bitmask of the values that can still legally go in (row, col)
+    Bit num is set when num is unused in the cell's row, column and box
+
+	Parameters:
+	row and col are the row index and col index of the cell
+
+	Return: int
+    '''
+    def candidates(self, row, col):
+        used = self.row_masks[row] | self.col_masks[col] | self.box_masks[self.box_index(row, col)]
+        return ~used & (((1 << self.row_length) - 1) << 1)
 
     '''
 	Returns a 2D python list of numbers which represents the board
+    This is a fresh copy built from self.cells, so changing it does not change the generator
 
 	Parameters: None
 	Return: list[list]
     '''
     def get_board(self):
-        return self.board
+        return unflatten(self.cells, self.row_length)
+
+    '''
+    A live 2D view of the board: gen.board[row][col] reads self.cells, and assigning to it
+    goes through clear_value/place_value so the bitmasks stay in step. Nothing is copied;
+    use get_board for a snapshot
+    '''
+    @property
+    def board(self):
+        return BoardView(self)
+
+    '''
+    Returns a snapshot of the board as flat bytes (one byte per cell, row by row)
+    This is a cheap copy of self.cells and about a tenth of the memory of get_board()
+
+	Parameters: None
+	Return: bytes
+    '''
+    def get_cells(self):
+        return bytes(self.cells)
 
     '''
 	Displays the board to the console
@@ -45,7 +242,7 @@ class SudokuGenerator:
 	Return: None
     '''
     def print_board(self):
-        for row in self.board:
+        for row in self.get_board():
             for num in row:
                 print(num)
             print()
@@ -61,10 +258,7 @@ class SudokuGenerator:
 	Return: boolean
     '''
     def valid_in_row(self, row, num):
-        for col in range(self.row_length):
-            if self.board[row][col] == num:
-                return False
-        return True
+        return not self.row_masks[row] & (1 << num)
 
     '''
 	Determines if num is contained in the specified column (vertical) of the board
@@ -77,10 +271,7 @@ class SudokuGenerator:
 	Return: boolean
     '''
     def valid_in_col(self, col, num): #fixed
-        for row in range(self.row_length):
-            if self.board[row][col] == num:
-                return False
-        return True
+        return not self.col_masks[col] & (1 << num)
 
     '''
 	Determines if num is contained in the 3x3 box specified on the board
@@ -96,11 +287,7 @@ class SudokuGenerator:
     '''
 
     def valid_in_box(self, row_start, col_start, num):
-        for row in range(row_start, row_start + self.box_length):
-            for col in range(col_start, col_start + self.box_length):
-                if self.board[row][col] == num:
-                    return False
-        return True
+        return not self.box_masks[self.box_index(row_start, col_start)] & (1 << num)
     
     '''
     Determines if it is valid to enter num at (row, col) in the board
@@ -113,13 +300,8 @@ class SudokuGenerator:
 	Return: boolean
     '''
     def is_valid(self, row, col, num):
-        box_row_start = row - row % self.box_length
-        box_col_start = col - col % self.box_length
-        return all([
-            self.valid_in_row(row, num),
-            self.valid_in_col(col, num),
-            self.valid_in_box(box_row_start, box_col_start, num)
-        ])
+        used = self.row_masks[row] | self.col_masks[col] | self.box_masks[self.box_index(row, col)]
+        return not used & (1 << num)
 
     '''
     Fills the specified 3x3 box with values
@@ -137,18 +319,18 @@ class SudokuGenerator:
         random.shuffle(nums)
         for row in range(row_start, row_start + self.box_length):
             for col in range(col_start, col_start + self.box_length):
-                self.board[row][col] = nums.pop()
+                self.place_value(row, col, nums.pop())
 
     
     '''
-    Fills the three boxes along the main diagonal of the board
-    These are the boxes which start at (0,0), (3,3), and (6,6)
+    Fills the boxes along the main diagonal of the board
+    For 9x9 these are the boxes which start at (0,0), (3,3), and (6,6)
 
 	Parameters: None
 	Return: None
     '''
     def fill_diagonal(self):
-        for i in range(0,9,3):
+        for i in range(0, self.row_length, self.box_length):
             self.fill_box(i,i)
         return None
 
@@ -183,12 +365,51 @@ class SudokuGenerator:
                 if row >= self.row_length:
                     return True
         
+        options = self.candidates(row, col)
         for num in range(1, self.row_length + 1):
-            if self.is_valid(row, col, num):
-                self.board[row][col] = num
+            if options & (1 << num):
+                self.place_value(row, col, num)
                 if self.fill_remaining(row, col + 1):
                     return True
-                self.board[row][col] = 0
+                self.clear_value(row, col)
+        return False
+
+    '''
+    Fills every empty cell of the board, always branching on the empty cell
+    with the fewest remaining candidates (minimum remaining values)
+    Values are tried in increasing order, same as fill_remaining
+
+	Parameters: None
+
+	Return:
+	boolean (whether or not we could solve the board)
+    '''
+    def fill_remaining_mrv(self):
+        best = None
+        best_count = self.row_length + 1
+        for row in range(self.row_length):
+            for col in range(self.row_length):
+                if self.cells[row * self.row_length + col] == 0:
+                    count = bin(self.candidates(row, col)).count('1')
+                    if count < best_count:
+                        best, best_count = (row, col), count
+                        if count <= 1:
+                            break
+            if best_count <= 1:
+                break
+        if best is None:
+            return True
+        if best_count == 0:
+            return False
+
+        row, col = best
+        options = self.candidates(row, col)
+        for num in range(1, self.row_length + 1):
+            if options & (1 << num):
+                self.place_value(row, col, num)
+                if self.fill_remaining_mrv():
+                    return True
+                self.clear_value(row, col)
         return False
 
     '''
@@ -200,8 +421,114 @@ class SudokuGenerator:
 	Return: None
     '''
     def fill_values(self):
+        if self.stats is not None:
+            self.fill_values_counted()
+            return
+        if self.derive is not None:
+            self.fill_derived()
+            return
         self.fill_diagonal()
-        self.fill_remaining(0, self.box_length)
+        self.fill_rest()
+
+    '''
+    Fills the cells left empty by fill_diagonal with the configured method:
+    self.engine if it is not the backtracker, else fill_remaining_mrv or fill_remaining
+
+	Parameters: None
+	Return: None
+    '''
+    def fill_rest(self):
+        if self.engine.name != 'backtrack':
+            self.fill_with_engine()
+        elif self.mrv:
+            self.fill_remaining_mrv()
+        else:
+            self.fill_remaining(0, self.box_length)
+
+    '''
+    fill_values with self.stats recording: phase times, plus search counters taken by
+    shadowing candidates/place_value/clear_value with counting versions for the duration
+    of the fill, so the uninstrumented methods never pay for the bookkeeping
+    nodes counts candidate evaluations, backtracks counts values taken back, and depth is
+    the number of values the search has placed at once; only the fill_remaining searches
+    are counted (stats.counted), engine and derived fills are timed but not counted
+
+	Parameters: None
+	Return: None
+    '''
+    def fill_values_counted(self):
+        stats = self.stats
+        start = time.perf_counter()
+        if self.derive is not None:
+            self.fill_derived()
+            stats.lap('derive', start)
+            return
+        self.fill_diagonal()
+        start = stats.lap('fill_diagonal', start)
+        if self.engine.name != 'backtrack':
+            self.fill_with_engine()
+            stats.lap('fill_remaining', start)
+            return
+
+        candidates, place_value, clear_value = self.candidates, self.place_value, self.clear_value
+        depth = 0
+
+        def counted_candidates(row, col):
+            stats.nodes += 1
+            return candidates(row, col)
+
+        def counted_place_value(row, col, num):
+            nonlocal depth
+            depth += 1
+            if depth > stats.max_depth:
+                stats.max_depth = depth
+            place_value(row, col, num)
+
+        def counted_clear_value(row, col):
+            nonlocal depth
+            depth -= 1
+            stats.backtracks += 1
+            clear_value(row, col)
+
+        self.candidates, self.place_value, self.clear_value = counted_candidates, counted_place_value, counted_clear_value
+        try:
+            self.fill_rest()
+        finally:
+            del self.candidates, self.place_value, self.clear_value
+        stats.counted += 1
+        stats.lap('fill_remaining', start)
+
+    '''
+    Fills the remaining cells using self.engine instead of fill_remaining
+    Candidates are tried in random order so different seeds give different boards
+
+	Parameters: None
+
+	Return:
+	boolean (whether or not we could solve the board)
+    '''
+    def fill_with_engine(self):
+        solution = self.engine.solve(self.get_board(), rng=random)
+        if solution is None:
+            return False
+        for row in range(self.row_length):
+            for col in range(self.row_length):
+                if self.cells[row * self.row_length + col] == 0:
+                    self.place_value(row, col, solution[row][col])
+        return True
+
+    '''
+    Fills the whole board with a solution served by self.derive (a SolutionPool)
+    The board must be empty before calling this
+
+	Parameters: None
+	Return: None
+    '''
+    def fill_derived(self):
+        solution = self.derive.next_solution()
+        for row in range(self.row_length):
+            for col in range(self.row_length):
+                self.place_value(row, col, solution[row][col])
 
     '''
     Removes the appropriate number of cells from the board
@@ -217,14 +544,149 @@ class SudokuGenerator:
     '''
 
     def remove_cells(self):
+        if self.unique:
+            self.remove_cells_unique()
+            return
         cells_to_remove = self.removed_cells
         while cells_to_remove > 0:
             row = random.randint(0, self.row_length - 1)
             col = random.randint(0, self.row_length - 1)
-            if self.board[row][col] != 0:
-                self.board[row][col] = 0
+            if self.cells[row * self.row_length + col] != 0:
+                self.clear_value(row, col)
                 cells_to_remove -= 1
 
+    '''
+    Removes up to removed_cells cells while keeping the puzzle uniquely solvable
+    Cells are tried in random order; a removal that lets a second solution appear
+    is undone and the next cell is tried instead
+    If time_budget runs out, or no more cells can be removed without breaking uniqueness,
+    the puzzle is returned with fewer cells removed (it is still uniquely solvable)
+
+	Parameters: None
+
+	Return:
+	int (the number of cells actually removed)
+    '''
+    def remove_cells_unique(self):
+        deadline = None
+        if self.time_budget is not None:
+            deadline = time.perf_counter() + self.time_budget
+        cells = [(row, col) for row in range(self.row_length) for col in range(self.row_length)]
+        random.shuffle(cells)
+        removed = 0
+        for row, col in cells:
+            if removed >= self.removed_cells:
+                break
+            num = self.cells[row * self.row_length + col]
+            if num == 0:
+                continue
+            self.clear_value(row, col)
+            if self.stats is not None:
+                self.stats.solver_calls += 1
+            try:
+                unique = self.engine.count(self.get_board(), 2, deadline) == 1
+            except TimeoutError:
+                self.place_value(row, col, num)
+                break
+            if unique:
+                removed += 1
+            else:
+                self.place_value(row, col, num)
+        return removed
+
+'''
+Opt-in counters and timings for puzzle generation (pass one as stats= to generate_sudoku,
+generate_sudoku_flat, generate_sudoku_batch or SudokuGenerator)
+A single object can be reused across puzzles and batches to aggregate them; merge adds
+another one in, e.g. the per-chunk stats coming back from worker processes
+
+self.puzzles		- puzzles generated
+self.counted		- puzzles whose fill was measured by the search counters below; fills by an
+					  engine or derived from a SolutionPool run no countable search and are not
+					  included (as_dict and repr show the counters as None while this is 0)
+self.nodes			- candidate evaluations made while filling (see fill_values_counted)
+self.backtracks		- values the fill search placed and then took back
+self.max_depth		- the most values the fill search had placed at once
+self.solver_calls	- solution counts run by unique cell removal
+self.phases			- dict of phase name -> total seconds: fill_diagonal, fill_remaining (or derive),
+					  copy (snapshots of the solution and board) and remove_cells
+'''
+class GenerationStats:
+    def __init__(self):
+        self.puzzles = 0
+        self.counted = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.solver_calls = 0
+        self.phases = {}
+
+    '''
+    Adds the time since start to phase and returns the current time, to start the next phase
+    '''
+    def lap(self, phase, start):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+        return now
+
+    '''
+    Runs the steps of generate_sudoku on sudoku, timing each phase
+
+	Parameters:
+	sudoku is a SudokuGenerator created with stats=self
+	snapshot is the method that copies its board (get_board or get_cells)
+
+	Return: (board, solution)
+    '''
+    def generate(self, sudoku, snapshot):
+        sudoku.fill_values()
+        start = time.perf_counter()
+        solution = snapshot()
+        start = self.lap('copy', start)
+        sudoku.remove_cells()
+        start = self.lap('remove_cells', start)
+        board = snapshot()
+        self.lap('copy', start)
+        self.puzzles += 1
+        return board, solution
+
+    '''
+    Adds another GenerationStats into this one and returns self
+    '''
+    def merge(self, other):
+        self.puzzles += other.puzzles
+        self.counted += other.counted
+        self.nodes += other.nodes
+        self.backtracks += other.backtracks
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.solver_calls += other.solver_calls
+        for phase, seconds in other.phases.items():
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        return self
+
+    '''
+    Returns the search counter, or None if no fill was measured (see self.counted)
+    '''
+    def counter(self, value):
+        return value if self.counted else None
+
+    def as_dict(self):
+        return {
+            'puzzles': self.puzzles,
+            'counted': self.counted,
+            'nodes': self.counter(self.nodes),
+            'backtracks': self.counter(self.backtracks),
+            'max_depth': self.counter(self.max_depth),
+            'solver_calls': self.solver_calls,
+            'phases': dict(self.phases),
+        }
+
+    def __repr__(self):
+        phases = ', '.join(f'{phase}={seconds * 1000:.1f}ms' for phase, seconds in self.phases.items())
+        return (f'GenerationStats(puzzles={self.puzzles}, counted={self.counted}, nodes={self.counter(self.nodes)}, '
+                f'backtracks={self.counter(self.backtracks)}, max_depth={self.counter(self.max_depth)}, '
+                f'solver_calls={self.solver_calls}, {phases})')
+
 '''
 DO NOT CHANGE
 Provided for students
@@ -237,14 +699,275 @@ Given a number of rows and number of cells to remove, this function:
 Parameters:
 size is the number of rows/columns of the board (9 for this project)
 removed is the number of cells to clear (set to 0)
+unique is an optional boolean - keep the puzzle uniquely solvable (see remove_cells_unique)
+time_budget is an optional number of seconds for unique removal
+engine is an optional solving engine name (see SudokuGenerator)
+derive is an optional boolean or SolutionPool - derive the solution by symmetry transforms (see SudokuGenerator)
+stats is an optional GenerationStats - adds this puzzle's counters and phase timings to it
 
 Return: list[list] (a 2D Python list to represent the board)
 '''
-def generate_sudoku(size, removed):
-    sudoku = SudokuGenerator(size, removed)
+def generate_sudoku(size, removed, unique=False, time_budget=None, engine=None, derive=False, stats=None):
+    sudoku = SudokuGenerator(size, removed, unique=unique, time_budget=time_budget, engine=engine, derive=derive, stats=stats)
+    if stats is not None:
+        return stats.generate(sudoku, sudoku.get_board)
     sudoku.fill_values()
-    solution = copy.deepcopy(sudoku.get_board())
+    solution = sudoku.get_board()
     sudoku.remove_cells()
     board = sudoku.get_board()
     return board, solution
 
+'''
+Same as generate_sudoku, but returns the board and solution as flat bytes
+(one byte per cell, row by row; see sudoku_board.unflatten to get 2D lists back)
+Use this when holding many puzzles in memory: each is ~10x smaller than the 2D lists
+
+Return: (bytes, bytes)
+'''
+def generate_sudoku_flat(size, removed, unique=False, time_budget=None, engine=None, derive=False, stats=None):
+    sudoku = SudokuGenerator(size, removed, unique=unique, time_budget=time_budget, engine=engine, derive=derive, stats=stats)
+    if stats is not None:
+        return stats.generate(sudoku, sudoku.get_cells)
+    sudoku.fill_values()
+    solution = sudoku.get_cells()
+    sudoku.remove_cells()
+    return sudoku.get_cells(), solution
+
+
+'''
+Returns a random permutation of the line (row or column) indices 0..size-1
+that keeps lines inside their band: bands are shuffled, then lines within each band
+
+Parameters:
+size is the number of rows/columns of the board
+box_length is the square root of size
+rng is the random generator to use
+
+Return: list of ints
+'''
+def shuffled_lines(size, box_length, rng=random):
+    bands = list(range(box_length))
+    rng.shuffle(bands)
+    lines = []
+    for band in bands:
+        inner = list(range(band * box_length, (band + 1) * box_length))
+        rng.shuffle(inner)
+        lines.extend(inner)
+    return lines
+
+'''
+Returns a new solved grid equivalent to grid under a random sudoku symmetry:
+digit relabeling, row swaps within a band, column swaps within a stack,
+band swaps, stack swaps and (half the time) transposition
+Any valid grid stays valid, so this is a cheap replacement for fill_values
+
+Parameters:
+grid is a solved 2D list of ints
+rng is the random generator to use
+
+Return: list[list]
+'''
+def transform_grid(grid, rng=random):
+    size = len(grid)
+    box_length = int(math.sqrt(size))
+    digits = list(range(1, size + 1))
+    rng.shuffle(digits)
+    relabel = [0] + digits
+    rows = shuffled_lines(size, box_length, rng)
+    cols = shuffled_lines(size, box_length, rng)
+    result = [[relabel[grid[row][col]] for col in cols] for row in rows]
+    if rng.random() < 0.5:
+        result = [list(line) for line in zip(*result)]
+    return result
+
+'''
+A small pool of freshly filled seed grids that serves new solutions by transforming them
+Every refresh_every solutions served, the oldest seed is replaced by a newly filled grid,
+so the pool keeps drifting instead of deriving everything from the same few seeds
+
+self.size			- the number of rows/columns of the grids
+self.pool_size		- how many seed grids to keep
+self.refresh_every	- solutions served between seed refreshes (0 never refreshes)
+self.seed			- when set, seed grid j is filled from its own random stream derived from it, so
+					  pools with the same seed hold the same grids in any process (None fills from
+					  the module random generator)
+self.seeds			- the seed grids, filled lazily on first use
+self.first			- the number of seed grids retired before seeds[0]
+self.served			- number of solutions served so far
+self.fills			- number of seed grids filled so far
+'''
+class SolutionPool:
+    def __init__(self, size, pool_size=4, refresh_every=500, seed=None):
+        self.size = size
+        self.pool_size = pool_size
+        self.refresh_every = refresh_every
+        self.seed = seed
+        self.seeds = []
+        self.first = 0
+        self.served = 0
+        self.fills = 0
+
+    '''
+    Fills a brand new solved grid from scratch with SudokuGenerator.fill_values
+
+	Parameters: None
+	Return: list[list]
+    '''
+    def fill_seed(self):
+        state = None
+        if self.seed is not None:
+            state = random.getstate()
+            random.seed((self.seed << 32) + self.first + len(self.seeds))
+        sudoku = SudokuGenerator(self.size, 0)
+        sudoku.fill_values()
+        if state is not None:
+            random.setstate(state)
+        self.fills += 1
+        return sudoku.get_board()
+
+    '''
+    Returns a new solved grid derived from a random seed grid
+
+	Parameters: None
+	Return: list[list]
+    '''
+    def next_solution(self):
+        while len(self.seeds) < self.pool_size:
+            self.seeds.append(self.fill_seed())
+        if self.refresh_every and self.served and self.served % self.refresh_every == 0:
+            self.seeds.pop(0)
+            self.first += 1
+            self.seeds.append(self.fill_seed())
+        self.served += 1
+        return transform_grid(random.choice(self.seeds))
+
+    '''
+    Puts the pool in the state it has after serving served solutions, keeping the seed grids
+    it holds that are still in use; with self.seed set, the solutions served next are then
+    the same as if the pool had served every solution before them
+
+	Parameters:
+	served is the number of solutions to count as served
+
+	Return: None
+    '''
+    def seek(self, served):
+        first = (served - 1) // self.refresh_every if self.refresh_every and served else 0
+        self.seeds = self.seeds[first - self.first:] if first >= self.first else []
+        self.first = first
+        self.served = served
+
+'''
+Returns the shared SolutionPool for the given board size, creating it on first use
+Change its pool_size / refresh_every attributes to tune how often seeds are refreshed
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return: SolutionPool
+'''
+solution_pools = {}
+
+def get_solution_pool(size):
+    if size not in solution_pools:
+        solution_pools[size] = SolutionPool(size)
+    return solution_pools[size]
+
+# the SolutionPool of the batch this process generated a chunk for last (see chunk_solution_pool)
+chunk_pool = None
+
+'''
+Returns this process's SolutionPool for a batch, moved to the chunk's first puzzle
+The pool is kept between chunks, so each process fills a batch's seed grids once; the grids
+are seeded from the batch, so a chunk derives the same solutions whichever process runs it
+
+Parameters:
+size is the number of rows/columns of the board
+pool_size and refresh_every are the SolutionPool settings
+seed is the batch's pool seed (see SolutionPool.seed)
+served is the index of the chunk's first puzzle within the batch
+
+Return: SolutionPool
+'''
+def chunk_solution_pool(size, pool_size, refresh_every, seed, served):
+    global chunk_pool
+    if chunk_pool is None or (chunk_pool.size, chunk_pool.pool_size, chunk_pool.refresh_every, chunk_pool.seed) != (size, pool_size, refresh_every, seed):
+        chunk_pool = SolutionPool(size, pool_size, refresh_every, seed)
+    chunk_pool.seek(served)
+    return chunk_pool
+
+'''
+Generates puzzles for one chunk of a batch inside a worker process
+The module-level random generator is reseeded with chunk_seed first, so every
+chunk is reproducible no matter which worker picks it up
+
+Parameters:
+task is a tuple (size, removed, count, chunk_seed, unique, time_budget, engine, derive, flat, with_stats),
+where derive is False or the chunk_solution_pool arguments (pool_size, refresh_every, seed, served)
+
+Return: (list of (board, solution) tuples, GenerationStats for the chunk or None)
+'''
+def generate_chunk(task):
+    size, removed, count, chunk_seed, unique, time_budget, engine, derive, flat, with_stats = task
+    random.seed(chunk_seed)
+    if derive:
+        derive = chunk_solution_pool(size, *derive)
+    stats = GenerationStats() if with_stats else None
+    generate = generate_sudoku_flat if flat else generate_sudoku
+    return [generate(size, removed, unique, time_budget, engine, derive, stats) for _ in range(count)], stats
+
+'''
+Generates count puzzles spread across a pool of worker processes
+Puzzles are yielded as soon as each chunk finishes, in a fixed order, so the
+same seed always produces the same sequence of puzzles regardless of workers
+
+Parameters:
+size is the number of rows/columns of the board
+removed is the number of cells to clear in each puzzle
+count is the number of puzzles to generate
+workers is the number of processes to use (defaults to os.cpu_count(); 1 runs in this process)
+seed is an optional int - seeds the per-chunk random streams (None for a random batch)
+unique, time_budget and engine are passed through to generate_sudoku
+derive is an optional boolean or SolutionPool - derive solutions from seed grids; each worker
+process keeps one pool for the whole batch, with the pool_size and refresh_every of a
+SolutionPool passed here (its own seed grids are not shared with the workers)
+flat is an optional boolean - yield flat bytes pairs like generate_sudoku_flat (also much cheaper to send between processes)
+chunk_size is the number of puzzles each worker generates per task
+stats is an optional GenerationStats - every chunk's counters and timings are merged into it as the chunk arrives
+
+Return: generator of (board, solution) tuples
+'''
+def generate_sudoku_batch(size, removed, count, workers=None, seed=None, unique=False, time_budget=None, engine=None, derive=False, flat=False, chunk_size=16, stats=None):
+    master = random.Random(seed)
+    starts = range(0, count, chunk_size)
+    chunk_seeds = [master.getrandbits(64) for _ in starts]
+    if derive:
+        settings = derive if isinstance(derive, SolutionPool) else SolutionPool(size)
+        pool = (settings.pool_size, settings.refresh_every, master.getrandbits(64))
+    tasks = []
+    for start, chunk_seed in zip(starts, chunk_seeds):
+        chunk_derive = pool + (start,) if derive else False
+        tasks.append((size, removed, min(chunk_size, count - start), chunk_seed, unique, time_budget, engine, chunk_derive, flat, stats is not None))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        # run in this process without disturbing the caller's random state
+        for task in tasks:
+            state = random.getstate()
+            chunk, chunk_stats = generate_chunk(task)
+            random.setstate(state)
+            if stats is not None:
+                stats.merge(chunk_stats)
+            yield from chunk
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for chunk, chunk_stats in pool.imap(generate_chunk, tasks):
+            if stats is not None:
+                stats.merge(chunk_stats)
+            yield from chunk
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,427 @@
+import math,sys
+from itertools import combinations
+from sudoku_board import flatten, get_peers
+
+"""
+Grades puzzles the way a person would solve them: repeatedly apply the easiest
+technique that makes progress, and rate the puzzle by the hardest technique it needed
+and how many steps it took. Puzzles that no technique here can finish need guessing;
+puzzles whose candidates run out along the way have no solution and are graded invalid.
+
+Candidates are kept as bitmasks (bit num set when num is still possible), the same
+layout as SudokuGenerator's row/col/box masks.
+
+"""
+
+# (technique, weight) from easiest to hardest; techniques are tried in this order
+TECHNIQUES = [
+    ('naked_single', 1),
+    ('hidden_single', 2),
+    ('locked_candidates', 3),
+    ('naked_pair', 4),
+    ('hidden_pair', 5),
+    ('naked_triple', 6),
+    ('hidden_triple', 7),
+    ('x_wing', 8),
+    ('guessing', 10),
+]
+TECHNIQUE_WEIGHTS = dict(TECHNIQUES)
+
+# difficulty label by hardest technique needed
+TECHNIQUE_LEVELS = {
+    'naked_single': 'easy',
+    'hidden_single': 'easy',
+    'locked_candidates': 'medium',
+    'naked_pair': 'medium',
+    'hidden_pair': 'medium',
+    'naked_triple': 'hard',
+    'hidden_triple': 'hard',
+    'x_wing': 'hard',
+    'guessing': 'expert',
+}
+
+'''
+Returns (and caches) the units of a board size: every row, column and box as a tuple of cell indices
+Rows come first, then columns, then boxes
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return: list of tuples of ints
+'''
+unit_cache = {}
+
+def get_units(size):
+    if size in unit_cache:
+        return unit_cache[size]
+    box_length = int(math.sqrt(size))
+    units = [tuple(row * size + col for col in range(size)) for row in range(size)]
+    units += [tuple(row * size + col for row in range(size)) for col in range(size)]
+    for box_row in range(0, size, box_length):
+        for box_col in range(0, size, box_length):
+            units.append(tuple(row * size + col for row in range(box_row, box_row + box_length)
+                               for col in range(box_col, box_col + box_length)))
+    unit_cache[size] = units
+    return units
+
+'''
+Returns (and caches) the box/line intersections of a board size used by locked candidates:
+one (segment, line_rest, box_rest) entry per box and row/column crossing it, where segment is
+the cells they share, line_rest the rest of the row/column and box_rest the rest of the box
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return: list of tuples of tuples of ints
+'''
+segment_cache = {}
+
+def get_segments(size):
+    if size in segment_cache:
+        return segment_cache[size]
+    units = get_units(size)
+    segments = []
+    for box in units[2 * size:]:
+        for line in units[:2 * size]:
+            segment = tuple(i for i in line if i in box)
+            if segment:
+                segments.append((segment, tuple(i for i in line if i not in box),
+                                 tuple(i for i in box if i not in line)))
+    segment_cache[size] = segments
+    return segments
+
+'''
+The result of grading one puzzle
+
+self.technique	- the hardest technique needed ('guessing' if the techniques ran out, None if invalid)
+self.level		- 'easy', 'medium', 'hard' or 'expert' (see TECHNIQUE_LEVELS), or 'invalid'
+self.steps		- how many times a technique made progress
+self.counts		- dict of technique name -> times it was used
+self.solved		- whether the techniques alone solved the puzzle
+self.score		- (weight of the hardest technique, steps), so grades sort from easiest to hardest
+'''
+class Grade:
+    def __init__(self, technique, steps, counts, solved, valid=True):
+        self.technique = technique
+        self.level = TECHNIQUE_LEVELS.get(technique, 'easy') if valid else 'invalid'
+        self.steps = steps
+        self.counts = counts
+        self.solved = solved
+        self.score = (TECHNIQUE_WEIGHTS.get(technique, 0), steps)
+
+    def __repr__(self):
+        return f'Grade({self.level}, technique={self.technique}, steps={self.steps})'
+
+'''
+Solves a puzzle with human techniques only, recording which ones it needed
+Use grade() rather than this class directly; it adds caching
+
+self.values		- flat bytearray of placed values
+self.cands		- flat list of candidate bitmasks (0 for placed cells)
+self.counts		- dict of technique name -> times it made progress
+self.valid		- False once the givens or a deduction contradict each other
+'''
+class HumanSolver:
+    def __init__(self, cells, size):
+        self.size = size
+        self.box_length = int(math.sqrt(size))
+        self.units = get_units(size)
+        self.peers = get_peers(size)
+        self.values = bytearray(size * size)
+        full = ((1 << size) - 1) << 1
+        self.cands = [full] * (size * size)
+        self.counts = {}
+        self.valid = True
+        self.empty = size * size
+        for i, value in enumerate(cells):
+            if value != 0:
+                if not self.cands[i] & (1 << value):
+                    self.valid = False
+                self.place(i, value)
+
+    def place(self, i, value):
+        bit = 1 << value
+        values = self.values
+        cands = self.cands
+        values[i] = value
+        cands[i] = 0
+        self.empty -= 1
+        for peer in self.peers[i]:
+            if cands[peer] & bit:
+                cands[peer] ^= bit
+                if not cands[peer]:
+                    self.valid = False
+
+    '''
+    Applies techniques until the puzzle is solved or none of them makes progress
+
+	Parameters: None
+	Return: Grade
+    '''
+    def run(self):
+        steps = 0
+        hardest = 'naked_single'
+        techniques = [
+            ('naked_single', self.naked_singles),
+            ('hidden_single', self.hidden_singles),
+            ('locked_candidates', self.locked_candidates),
+            ('naked_pair', lambda: self.naked_subsets(2)),
+            ('hidden_pair', lambda: self.hidden_subsets(2)),
+            ('naked_triple', lambda: self.naked_subsets(3)),
+            ('hidden_triple', lambda: self.hidden_subsets(3)),
+            ('x_wing', self.x_wing),
+        ]
+        while self.valid and self.empty:
+            for name, technique in techniques:
+                if technique():
+                    self.counts[name] = self.counts.get(name, 0) + 1
+                    steps += 1
+                    if TECHNIQUE_WEIGHTS[name] > TECHNIQUE_WEIGHTS[hardest]:
+                        hardest = name
+                    break
+            else:
+                if not self.contradiction():
+                    return Grade('guessing', steps, self.counts, False)
+                self.valid = False
+        return Grade(hardest if self.valid else None, steps, self.counts, self.valid, self.valid)
+
+    '''
+    Returns whether the candidates ran out somewhere: an empty cell with none left, or a digit
+    that can no longer go anywhere in a unit (eliminations do not check this as they go)
+    '''
+    def contradiction(self):
+        values = self.values
+        cands = self.cands
+        full = ((1 << self.size) - 1) << 1
+        for i, mask in enumerate(cands):
+            if not mask and not values[i]:
+                return True
+        for unit in self.units:
+            seen = 0
+            for i in unit:
+                seen |= cands[i] | 1 << values[i]
+            if seen & full != full:
+                return True
+        return False
+
+    # A cell with a single candidate takes that value
+    def naked_singles(self):
+        progress = False
+        cands = self.cands
+        for i in range(len(cands)):
+            mask = cands[i]
+            if mask and mask & (mask - 1) == 0:
+                self.place(i, mask.bit_length() - 1)
+                progress = True
+        return progress
+
+    # A digit with a single possible cell in a unit goes there
+    def hidden_singles(self):
+        cands = self.cands
+        progress = False
+        for unit in self.units:
+            seen_once = 0
+            seen_twice = 0
+            for i in unit:
+                seen_twice |= seen_once & cands[i]
+                seen_once |= cands[i]
+            singles = seen_once & ~seen_twice
+            while singles:
+                bit = singles & -singles
+                singles ^= bit
+                for i in unit:
+                    if cands[i] & bit:
+                        self.place(i, bit.bit_length() - 1)
+                        progress = True
+                        break
+        return progress
+
+    # If a digit's candidates in a box all lie in one row/column segment, it can be removed
+    # from the rest of that row/column; if a row/column's all lie in one box segment, it
+    # can be removed from the rest of that box
+    def locked_candidates(self):
+        cands = self.cands
+        progress = False
+        for segment, line_rest, box_rest in get_segments(self.size):
+            seg = 0
+            for i in segment:
+                seg |= cands[i]
+            if not seg:
+                continue
+            in_line = 0
+            for i in line_rest:
+                in_line |= cands[i]
+            in_box = 0
+            for i in box_rest:
+                in_box |= cands[i]
+            pointing = seg & in_line & ~in_box
+            claiming = seg & in_box & ~in_line
+            if pointing:
+                for i in line_rest:
+                    cands[i] &= ~pointing
+                progress = True
+            if claiming:
+                for i in box_rest:
+                    cands[i] &= ~claiming
+                progress = True
+        return progress
+
+    # k cells in a unit whose candidates together are exactly k digits: those digits
+    # can be removed from every other cell of the unit
+    def naked_subsets(self, k):
+        cands = self.cands
+        for unit in self.units:
+            small = [i for i in unit if cands[i] and bin(cands[i]).count('1') <= k]
+            if len(small) < k:
+                continue
+            progress = False
+            for group in combinations(small, k):
+                union = 0
+                for i in group:
+                    union |= cands[i]
+                if bin(union).count('1') != k:
+                    continue
+                for i in unit:
+                    if i not in group and cands[i] & union:
+                        cands[i] &= ~union
+                        progress = True
+            if progress:
+                return True
+        return False
+
+    # k digits confined to the same k cells of a unit: those cells can hold nothing else
+    def hidden_subsets(self, k):
+        cands = self.cands
+        for unit in self.units:
+            places = positions(cands, unit)
+            digits = [bit for bit, spots in places.items() if bin(spots).count('1') <= k]
+            if len(digits) < k:
+                continue
+            for group in combinations(digits, k):
+                spots = 0
+                keep = 0
+                for bit in group:
+                    spots |= places[bit]
+                    keep |= bit
+                if bin(spots).count('1') != k:
+                    continue
+                progress = False
+                for pos, i in enumerate(unit):
+                    if spots >> pos & 1 and cands[i] & ~keep:
+                        cands[i] &= keep
+                        progress = True
+                if progress:
+                    return True
+        return False
+
+    # A digit with exactly two places in each of two rows, in the same two columns,
+    # can be removed from those columns in every other row (and the same with rows/columns swapped)
+    def x_wing(self):
+        size = self.size
+        cands = self.cands
+        units = self.units
+        for lines, crossing in ((units[:size], units[size:2 * size]), (units[size:2 * size], units[:size])):
+            line_places = [positions(cands, line) for line in lines]
+            for value in range(1, size + 1):
+                bit = 1 << value
+                wings = {}
+                for line, places in enumerate(line_places):
+                    spots = places.get(bit, 0)
+                    if spots and spots & (spots - 1) and bin(spots).count('1') == 2:
+                        wings.setdefault(spots, []).append(line)
+                progress = False
+                for spots, wing_lines in wings.items():
+                    if len(wing_lines) != 2:
+                        continue
+                    for pos in range(size):
+                        if not spots >> pos & 1:
+                            continue
+                        for other, i in enumerate(crossing[pos]):
+                            if other not in wing_lines and cands[i] & bit:
+                                cands[i] ^= bit
+                                progress = True
+                if progress:
+                    return True
+        return False
+
+'''
+Returns where each candidate digit can go within a unit
+
+Parameters:
+cands is the flat list of candidate bitmasks
+unit is a tuple of cell indices
+
+Return: dict of digit bit -> bitmask of positions (bit pos set when unit[pos] can hold the digit)
+'''
+def positions(cands, unit):
+    places = {}
+    for pos, i in enumerate(unit):
+        mask = cands[i]
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            places[bit] = places.get(bit, 0) | (1 << pos)
+    return places
+
+'''
+Returns the key a puzzle's grade is cached under: its flat cells with the digits relabelled
+in order of first appearance, so puzzles that differ only by swapping digits share a grade
+(a full canonical form, see sudoku_canon, costs more than grading the puzzle)
+
+Parameters:
+cells is the flat puzzle (bytes or bytearray, 0 for empty)
+
+Return: bytes
+'''
+def puzzle_key(cells):
+    table = bytearray(range(256))
+    seen = {0}
+    for value in cells:
+        if value not in seen:
+            table[value] = len(seen)
+            seen.add(value)
+    return bytes(cells).translate(table)
+
+GRADE_CACHE_SIZE = 1 << 16  # grades GRADE_CACHE keeps before the least recently used is dropped
+
+# grades by puzzle_key, least recently used first, shared by every grade() call that does not pass its own cache
+GRADE_CACHE = {}
+
+'''
+Grades a puzzle by the human techniques it needs, caching the result
+
+Parameters:
+board is the puzzle as a 2D list or flat cells (0 for empty)
+cache is a dict to memoize grades in (defaults to GRADE_CACHE; None disables caching)
+limit is the most grades cache keeps, least recently used dropped first (None for no limit;
+size it to the puzzles being graded so a repeated pass over them always hits)
+
+Return: Grade
+'''
+def grade(board, cache=GRADE_CACHE, limit=GRADE_CACHE_SIZE):
+    cells = board if isinstance(board, (bytes, bytearray)) else flatten(board)
+    key = puzzle_key(cells)
+    if cache is not None and key in cache:
+        cache[key] = result = cache.pop(key)  # reinserting marks it most recently used
+        return result
+    result = HumanSolver(cells, int(math.sqrt(len(cells)))).run()
+    if cache is not None:
+        cache[key] = result
+        if limit is not None and len(cache) > limit:
+            del cache[next(iter(cache))]
+    return result
+
+'''
+Grades every puzzle in a bank and prints how the stored difficulties compare to the graded levels:
+python3 sudoku_grader.py puzzles.bank
+'''
+if __name__ == '__main__':
+    from sudoku_bank import PuzzleBank
+    with PuzzleBank(sys.argv[1]) as bank:
+        limit = max(GRADE_CACHE_SIZE, sum(count for first, count in bank.index.values()))
+        for difficulty, (first, count) in bank.index.items():
+            levels = {}
+            for i in range(count):
+                level = grade(bank.get(difficulty, i)[0], limit=limit).level
+                levels[level] = levels.get(level, 0) + 1
+            print(f'{difficulty}: {levels}')
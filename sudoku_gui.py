@@ -1,11 +1,18 @@
 import pygame
+import os
 import sys
-from sudoku_generator import generate_sudoku
+from sudoku_board import SudokuBoard
+from sudoku_generator import difficulty_levels
+from sudoku_bank import PuzzleBank
+from sudoku_prefetch import PuzzlePrefetcher
+from sudoku_journal import MoveJournal, resume_journal
+from sudoku_hints import HintService
 
 # Constants
 WINDOW_WIDTH, WINDOW_HEIGHT = 900, 1000
 BOARD_SIZE = 900
-GRID_SIZE = 9
+GRID_SIZE = 9  # 9, 16 or 25 - see set_grid_size
+BOX_SIZE = 3
 CELL_SIZE = BOARD_SIZE // GRID_SIZE
 LINE_WIDTH = 2
 BOLD_LINE_WIDTH = 4
@@ -15,81 +22,292 @@ SELECTED_COLOR = (255, 0, 0)
 HIGHLIGHT_COLOR = (186, 85, 211)
 HIGHLIGHT_WIDTH = 5
 BUTTON_WIDTH, BUTTON_HEIGHT = 200, 60
-
-difficulty_levels = {
-    'easy': 30,
-    'medium': 40,
-    'hard': 50
+FPS = 60  # frame cap for the scene loop
+PUZZLE_BANK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'puzzles.bank')  # built by sudoku_bank.py
+PREFETCH_DEPTH = 3  # ready puzzles kept per difficulty
+UNIQUE_TIME_BUDGET = 2.0  # seconds allowed to keep each generated puzzle uniquely solvable
+SESSION_JOURNAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'session.journal')  # the game in progress
+HINT_EVENT = pygame.USEREVENT + 1  # posted by the hint service with a HintResult in event.result
+JOURNAL_FLUSH_EVENT = pygame.USEREVENT + 2  # timer: write the session journal's pending moves
+# Digit font: None uses the font bundled with pygame (no system font lookup at startup);
+# set a system font name such as 'arial' to look it up with SysFont on first draw instead
+DIGIT_FONT_NAME = None
+
+DIGIT_COLORS = {
+    'given': LINE_COLOR,
+    'user': (0, 0, 255),  # Different color for user input
+    'sketch': LINE_COLOR,
+    'conflict': SELECTED_COLOR  # digit clashes with another in its row, column or box
 }
-# Initialize the pygame and create font.
-pygame.font.init()
-FONT = pygame.font.SysFont('arial', 36)
+
+class RenderCache:
+    # Surfaces that never change once rendered: digit glyphs, titles and buttons.
+    # `created` counts surfaces actually rendered, so it stays flat once every screen has been shown.
+    def __init__(self):
+        self.fonts = {}
+        self.surfaces = {}
+        self.created = 0
+        self.hits = 0
+
+    def clear(self):
+        self.fonts.clear()
+        self.surfaces.clear()
+
+    def get(self, key, build):
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = build()
+            self.created += 1
+        else:
+            self.hits += 1
+        return surface
+
+    def font(self, size, name=None):
+        # Fonts are created on first use; name=None is pygame's bundled font
+        if (size, name) not in self.fonts:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            if name is None:
+                self.fonts[size, name] = pygame.font.Font(None, size)
+            else:
+                self.fonts[size, name] = pygame.font.SysFont(name, size)
+        return self.fonts[size, name]
+
+    def digit_font(self):
+        if DIGIT_FONT_NAME is None:
+            return self.font(CELL_SIZE * 48 // 100 + 4)
+        return self.font(min(36, CELL_SIZE * 36 // 100 + 4), DIGIT_FONT_NAME)
+
+    def digit(self, value, kind):
+        # kind is one of DIGIT_COLORS
+        return self.get(('digit', value, kind), lambda: self.digit_font().render(str(value), True, DIGIT_COLORS[kind]))
+
+    def text(self, text, size, color=(0, 0, 0)):
+        return self.get(('text', text, size, color), lambda: self.font(size).render(text, True, color))
+
+    def button(self, text, width, height, font_size):
+        def build():
+            button_surface = pygame.Surface((width, height))
+            pygame.draw.rect(button_surface, (0, 0, 0), button_surface.get_rect(), 3)
+            text_surface = self.font(font_size).render(text, True, (255, 255, 255))
+            text_rect = text_surface.get_rect(center=(width / 2, height / 2))
+            button_surface.blit(text_surface, text_rect)
+            return button_surface
+        return self.get(('button', text, width, height, font_size), build)
+
+    def prerender_digits(self):
+        for value in range(1, GRID_SIZE + 1):
+            for kind in DIGIT_COLORS:
+                self.digit(value, kind)
+
+RENDER_CACHE = RenderCache()
+
+def set_grid_size(size):
+    # Resize the grid constants to follow the board size (the digit font follows CELL_SIZE)
+    global GRID_SIZE, BOX_SIZE, CELL_SIZE
+    GRID_SIZE = size
+    BOX_SIZE = int(size ** 0.5)
+    CELL_SIZE = BOARD_SIZE // GRID_SIZE
+    RENDER_CACHE.clear()
+
+_puzzle_bank = None
+
+def get_puzzle_bank():
+    # Open PUZZLE_BANK once and keep it mapped; None if there is no bank for this board size
+    global _puzzle_bank
+    if _puzzle_bank is None and os.path.exists(PUZZLE_BANK):
+        _puzzle_bank = PuzzleBank(PUZZLE_BANK)
+    if _puzzle_bank is not None and _puzzle_bank.size == GRID_SIZE:
+        return _puzzle_bank
+    return None
+
+_prefetcher = None
+
+def get_prefetcher():
+    # Start the background puzzle producer on first use; replaced if the board size changes
+    global _prefetcher
+    if _prefetcher is not None and _prefetcher.size != GRID_SIZE:
+        _prefetcher.stop()
+        _prefetcher = None
+    if _prefetcher is None:
+        levels = {name: removed * GRID_SIZE * GRID_SIZE // 81 for name, removed in difficulty_levels.items()}
+        _prefetcher = PuzzlePrefetcher(GRID_SIZE, levels, PREFETCH_DEPTH, unique=True, time_budget=UNIQUE_TIME_BUDGET).start()
+    return _prefetcher
+
+_hint_service = None
+
+def get_hint_service():
+    # Start the background hint/solve worker on first use; its results arrive as HINT_EVENT
+    global _hint_service
+    if _hint_service is None:
+        _hint_service = HintService(lambda result: pygame.event.post(pygame.event.Event(HINT_EVENT, result=result))).start()
+    return _hint_service
+
 class Cell:
-    def __init__(self, value, row, col, screen):
-        self.value = value
-        self.sketched_value = 0
+    # A view onto one cell of the board model, plus the drawing-only state (selection, flag, dirty)
+    __slots__ = ('model', 'index', 'row', 'col', 'screen', 'selected', 'flagged', 'dirty')
+
+    def __init__(self, model, row, col, screen):
+        self.model = model
+        self.index = model.index(row, col)
         self.row = row
         self.col = col
         self.screen = screen
         self.selected = False
-        self.is_initial = value != 0
+        self.flagged = False  # drawn like a conflict: an entry that makes the puzzle unsolvable
+        self.dirty = True  # needs repainting on the next Board.draw
+
+    @property
+    def value(self):
+        return self.model.values[self.index]
+
+    @property
+    def sketched_value(self):
+        return self.model.sketches[self.index]
+
+    @property
+    def is_initial(self):
+        return bool(self.model.initial[self.index])
+
+    @property
+    def conflict(self):
+        return bool(self.model.conflicts[self.index])
 
     def set_cell_value(self, value):
-        if not self.is_initial: # so changes can't be made to other cells
-            self.value = value
+        # given cells are protected by the model
+        if self.model.set_value(self.row, self.col, value):
+            self.dirty = True
 
     def set_sketched_value(self, value):
-        if not self.is_initial: # same as above
-            self.sketched_value = value
+        if self.model.set_sketch(self.row, self.col, value):
+            self.dirty = True
+
+    def set_selected(self, selected):
+        if selected != self.selected:
+            self.selected = selected
+            self.dirty = True
+
+    def rect(self):
+        return pygame.Rect(self.col * CELL_SIZE, self.row * CELL_SIZE, CELL_SIZE, CELL_SIZE)
 
     def draw(self):
         x = self.col * CELL_SIZE
         y = self.row * CELL_SIZE
         rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
+        self.dirty = False
         pygame.draw.rect(self.screen, BACKGROUND_COLOR, rect)
         if self.value != 0:
-            text_color = LINE_COLOR if self.is_initial else (0, 0, 255)  # Different color for user input
-            text = FONT.render(str(self.value), True, text_color)
+            if self.conflict or self.flagged:
+                kind = 'conflict'
+            else:
+                kind = 'given' if self.is_initial else 'user'
+            text = RENDER_CACHE.digit(self.value, kind)
             self.screen.blit(text, (x + CELL_SIZE // 2 - text.get_width() // 2, y + CELL_SIZE // 2 - text.get_height() // 2))
         elif self.sketched_value != 0:
-            text = FONT.render(str(self.sketched_value), True, LINE_COLOR)
+            text = RENDER_CACHE.digit(self.sketched_value, 'sketch')
             self.screen.blit(text, (x + 5, y + 5))
         if self.selected:
             pygame.draw.rect(self.screen, HIGHLIGHT_COLOR, rect, HIGHLIGHT_WIDTH)
 
 class Board:
+    # Draws and edits a SudokuBoard model (values, counts and conflicts live in self.model)
     def __init__(self, screen, difficulty):
         self.screen = screen
-        self.difficulty = difficulty_levels[difficulty]
-        self.board = [[Cell(0, i, j, screen) for j in range(GRID_SIZE)] for i in range(GRID_SIZE)]
+        self.difficulty_name = difficulty
+        # difficulty_levels are counts for a 9x9 board; scale them to the current board size
+        # (None until resume_session reads it from the saved game)
+        self.difficulty = difficulty_levels[difficulty] * GRID_SIZE * GRID_SIZE // 81 if difficulty else None
+        self.model = SudokuBoard(GRID_SIZE)
+        self.board = [[Cell(self.model, i, j, screen) for j in range(GRID_SIZE)] for i in range(GRID_SIZE)]
+        self.cells = [cell for row in self.board for cell in row]  # same order as the model's flat lists
+        self.flagged = set()  # indices of the flagged cells, so clearing flags touches only those
         self.selected_cell = None
         self.selected_row = 0
         self.selected_col = 0
-        self.solution = None
+        self.full_redraw = True  # repaint everything on the next draw (first frame, screen changes)
+        self.journal = MoveJournal(self.model)  # replaced by a file-backed journal once a game starts
+
+    @property
+    def solution(self):
+        return self.model.solution
 
     def initialize_board(self):
-        puzzle, self.solution = generate_sudoku(GRID_SIZE, self.difficulty)
-        for i in range(GRID_SIZE):
-            for j in range(GRID_SIZE):
-                cell = self.board[i][j]
-                cell.set_cell_value(puzzle[i][j])
-                cell.is_initial = puzzle[i][j] != 0  # Mark initial puzzle cells
+        bank = get_puzzle_bank()
+        if bank is not None and bank.count(self.difficulty_name) > 0:
+            puzzle, solution = bank.random_puzzle(self.difficulty_name)
+        else:
+            puzzle, solution = get_prefetcher().get(self.difficulty_name)
+        self.model.load(puzzle, solution)
+        self.journal = MoveJournal(self.model, SESSION_JOURNAL, self.difficulty_name)
+        self.full_redraw = True
+
+    def resume_session(self):
+        # Continue the game saved in SESSION_JOURNAL; raises ValueError/OSError if there is none to resume
+        self.journal = resume_journal(SESSION_JOURNAL, self.model)
+        if self.journal.difficulty in difficulty_levels:
+            self.difficulty_name = self.journal.difficulty
+            self.difficulty = difficulty_levels[self.difficulty_name] * GRID_SIZE * GRID_SIZE // 81
+        self.full_redraw = True
+
+    def set_value(self, cell, value):
+        # every edit goes through the journal, so it can be undone and survives a restart
+        if self.journal.set_value(cell.row, cell.col, value):
+            cell.dirty = True
+            self.flag_cells(())
+
+    def flag_cells(self, indices):
+        # Mark the given cells (and unmark the rest) until the next edit
+        indices = set(indices)
+        if not indices and not self.flagged:
+            return
+        for i in self.flagged ^ indices:
+            cell = self.cells[i]
+            cell.flagged = i in indices
+            cell.dirty = True
+        self.flagged = indices
 
     def draw(self):
-        self.screen.fill(BACKGROUND_COLOR)
+        # Repaints only dirty cells (everything after full_redraw) and returns the screen rects
+        # that changed, for pygame.display.update
+        if self.full_redraw:
+            self.full_redraw = False
+            self.screen.fill(BACKGROUND_COLOR)
+            for row in self.board:
+                for cell in row:
+                    cell.draw()
+            for i in range(GRID_SIZE + 1):
+                line_width = BOLD_LINE_WIDTH if i % BOX_SIZE == 0 else LINE_WIDTH
+                pygame.draw.line(self.screen, LINE_COLOR, (0, i * CELL_SIZE), (BOARD_SIZE, i * CELL_SIZE), line_width)
+                pygame.draw.line(self.screen, LINE_COLOR, (i * CELL_SIZE, 0), (i * CELL_SIZE, BOARD_SIZE), line_width)
+            self.model.pop_changed()
+            return [self.screen.get_rect()]
+
+        for i in self.model.pop_changed():
+            self.cells[i].dirty = True  # value, sketch or conflict flag changed in the model
+        dirty_rects = []
         for row in self.board:
             for cell in row:
-                cell.draw()
-        for i in range(GRID_SIZE + 1):
-            line_width = BOLD_LINE_WIDTH if i % 3 == 0 else LINE_WIDTH
-            pygame.draw.line(self.screen, LINE_COLOR, (0, i * CELL_SIZE), (BOARD_SIZE, i * CELL_SIZE), line_width)
-            pygame.draw.line(self.screen, LINE_COLOR, (i * CELL_SIZE, 0), (i * CELL_SIZE, BOARD_SIZE), line_width)
+                if cell.dirty:
+                    cell.draw()
+                    self.draw_cell_border(cell)
+                    dirty_rects.append(cell.rect().inflate(2 * BOLD_LINE_WIDTH, 2 * BOLD_LINE_WIDTH))
+        return dirty_rects
+
+    def draw_cell_border(self, cell):
+        # Redraw the four grid lines around a single repainted cell
+        x, y = cell.col * CELL_SIZE, cell.row * CELL_SIZE
+        for i, top in ((cell.row, y), (cell.row + 1, y + CELL_SIZE)):
+            line_width = BOLD_LINE_WIDTH if i % BOX_SIZE == 0 else LINE_WIDTH
+            pygame.draw.line(self.screen, LINE_COLOR, (x, top), (x + CELL_SIZE, top), line_width)
+        for i, left in ((cell.col, x), (cell.col + 1, x + CELL_SIZE)):
+            line_width = BOLD_LINE_WIDTH if i % BOX_SIZE == 0 else LINE_WIDTH
+            pygame.draw.line(self.screen, LINE_COLOR, (left, y), (left, y + CELL_SIZE), line_width)
 
     def select(self, row, col):
         if self.selected_cell:
-            self.selected_cell.selected = False
+            self.selected_cell.set_selected(False)
         self.selected_cell = self.board[row][col]
-        self.selected_cell.selected = True
+        self.selected_cell.set_selected(True)
         self.selected_row, self.selected_col = row, col
 
     def arrow_selection(self, dx, dy):
@@ -101,261 +319,337 @@ class Board:
         if x < BOARD_SIZE and y < BOARD_SIZE:
             row = y // CELL_SIZE
             col = x // CELL_SIZE
-            self.select(row, col)
+            if row < GRID_SIZE and col < GRID_SIZE:
+                self.select(row, col)
 
     def clear(self):
         if self.selected_cell:
-            self.selected_cell.set_cell_value(0)
+            self.set_value(self.selected_cell, 0)
 
     def sketch(self, value):
-        if self.selected_cell:
-            self.selected_cell.set_sketched_value(value)
+        if self.selected_cell and self.journal.set_sketch(self.selected_cell.row, self.selected_cell.col, value):
+            self.selected_cell.dirty = True
 
     def place_number(self, value):
         if self.selected_cell:
-            self.selected_cell.set_cell_value(value)
+            self.set_value(self.selected_cell, value)
 
     def reset_to_original(self):
-        for row in self.board:
-            for cell in row:
-                if not cell.is_initial:  # Only reset cells that are not part of the initial puzzle
-                    cell.set_cell_value(0)
+        self.journal.reset_to_original()  # Only resets cells that are not part of the initial puzzle, as one undo step
+        self.flag_cells(())
+
+    def undo(self):
+        self.flag_cells(())
+        return self.journal.undo()
+
+    def redo(self):
+        self.flag_cells(())
+        return self.journal.redo()
 
     def is_full(self):
-        return all(cell.value != 0 for row in self.board for cell in row)
+        return self.model.is_full()
+
+    def update_board(self, result):
+        # Apply a HintResult from the hint service, if the board has not changed since it was asked for
+        if result.state != self.model.snapshot():
+            return False
+        if result.status == 'unsolvable':
+            self.flag_cells(result.cells)
+        elif result.status == 'ok' and result.kind == 'hint' and result.cell is not None:
+            row, col = divmod(result.cell, GRID_SIZE)
+            self.select(row, col)
+            self.set_value(self.board[row][col], result.value)
+        elif result.status == 'ok' and result.kind == 'solve':
+            # one undo step fills every empty cell
+            joined = False
+            for i, value in enumerate(self.model.values):
+                if value == 0:
+                    joined = self.journal.set_value(i // GRID_SIZE, i % GRID_SIZE, result.solution[i], joined) or joined
+        return True
 
-    def update_board(self):
-        pass
+    def request_hint(self, kind='hint'):
+        selected = self.selected_cell.index if self.selected_cell else None
+        return get_hint_service().request(self.model, kind, selected)
 
     def find_empty(self):
-        for i in range(GRID_SIZE):
-            for j in range(GRID_SIZE):
-                if self.board[i][j].value == 0:
-                    return (i, j)
-        return None
+        return self.model.find_empty()
 
     def check_board(self):
         # Check if current board matches the solution
-        for i in range(GRID_SIZE):
-            for j in range(GRID_SIZE):
-                if self.board[i][j].value != self.solution[i][j]:
-                    return False
-        return True
+        return self.model.check_board()
 
-def start_game(screen, difficulty):
-    board = Board(screen, difficulty)
-    board.initialize_board()
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                x, y = pygame.mouse.get_pos()
-                board.click(x, y)
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_1:
-                    board.place_number(1)
-                elif event.key == pygame.K_2:
-                    board.place_number(2)
-                elif event.key == pygame.K_3:
-                    board.place_number(3)
-                elif event.key == pygame.K_4:
-                    board.place_number(4)
-                elif event.key == pygame.K_5:
-                    board.place_number(5)
-                elif event.key == pygame.K_6:
-                    board.place_number(6)
-                elif event.key == pygame.K_7:
-                    board.place_number(7)
-                elif event.key == pygame.K_8:
-                    board.place_number(8)
-                elif event.key == pygame.K_9:
-                    board.place_number(9)
-                elif event.key == pygame.K_DELETE or event.key == pygame.K_BACKSPACE:
-                    board.clear()
-                elif event.key == pygame.K_UP:
-                    board.arrow_selection(0, -1)
-                elif event.key == pygame.K_DOWN:
-                    board.arrow_selection(0, 1)
-                elif event.key == pygame.K_LEFT:
-                    board.arrow_selection(-1, 0)
-                elif event.key == pygame.K_RIGHT:
-                    board.arrow_selection(1, 0)
-
-        board.draw()
-        button_rects = draw_buttons(screen)
-        pygame.display.flip()
-
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_pressed = pygame.mouse.get_pressed()
-        if mouse_pressed[0]:  # Left mouse button
-            if button_rects[0].collidepoint(mouse_pos):
-                board.reset_to_original()
-            elif button_rects[1].collidepoint(mouse_pos):
-                main()
-            elif button_rects[2].collidepoint(mouse_pos):
-                pygame.quit()
-                sys.exit()
+    def has_conflicts(self):
+        # True if any row, column or box holds the same digit twice
+        return self.model.has_conflicts()
 
-        # Check for win or loss condition
-        if board.is_full():
-            if board.check_board():
-                end_game(screen, "won")
+class TitleScene:
+    # Title screen: pick a difficulty
+    animating = False
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.easy_button_rect = pygame.Rect(75, 600, 150, 200)
+        self.med_button_rect = pygame.Rect(375, 600, 150, 200)
+        self.hard_button_rect = pygame.Rect(675, 600, 150, 200)
+        self.resume_button_rect = pygame.Rect(350, 850, 200, 80) if os.path.exists(SESSION_JOURNAL) else None
+        self.drawn = False
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if self.easy_button_rect.collidepoint(event.pos):
+                return GameScene(self.screen, 'easy')
+            elif self.med_button_rect.collidepoint(event.pos):
+                return GameScene(self.screen, 'medium')
+            elif self.hard_button_rect.collidepoint(event.pos):
+                return GameScene(self.screen, 'hard')
+            elif self.resume_button_rect and self.resume_button_rect.collidepoint(event.pos):
+                try:
+                    return GameScene(self.screen, None, resume=True)  # the difficulty comes from the saved game
+                except (ValueError, OSError):
+                    # no usable saved game (another board size, or a damaged file)
+                    self.resume_button_rect = None
+                    self.drawn = False
+        return self
+
+    def update(self):
+        return self
+
+    def close(self):
+        pass
+
+    def draw(self):
+        if self.drawn:
+            return []
+        self.drawn = True
+        screen = self.screen
+        screen.fill((255, 255, 255))
+
+        # Sudoku title and select difficulty message
+        screen.blit(RENDER_CACHE.text('Sudoku', 100), (350, 300))
+        screen.blit(RENDER_CACHE.text('Select Game Mode:', 65), (265, 450))
+
+        # Easy, Medium and Hard buttons
+        screen.blit(RENDER_CACHE.button('EASY', 150, 200, 45), self.easy_button_rect.topleft)
+        screen.blit(RENDER_CACHE.button('MEDIUM', 150, 200, 45), self.med_button_rect.topleft)
+        screen.blit(RENDER_CACHE.button('HARD', 150, 200, 45), self.hard_button_rect.topleft)
+        if self.resume_button_rect:
+            screen.blit(RENDER_CACHE.button('RESUME', 200, 80, 45), self.resume_button_rect.topleft)
+        return [screen.get_rect()]
+
+class GameScene:
+    # The board itself, with RESET / RESTART / EXIT buttons underneath
+    animating = False
+
+    def __init__(self, screen, difficulty, resume=False):
+        self.screen = screen
+        self.board = Board(screen, difficulty)
+        if resume:
+            self.board.resume_session()
+        else:
+            self.board.initialize_board()
+        self.button_rects = get_button_rects()
+        self.flush_scheduled = False
+
+    def close(self):
+        # leaving the game (restart, exit or window closed): write every pending move;
+        # the session stays resumable from the title screen
+        self.board.journal.close()
+
+    def handle_event(self, event):
+        board = self.board
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if self.button_rects[0].collidepoint(event.pos):
+                board.reset_to_original()
+            elif self.button_rects[1].collidepoint(event.pos):
+                return TitleScene(self.screen)
+            elif self.button_rects[2].collidepoint(event.pos):
+                return None
             else:
-                end_game(screen, "lost")
-
-def end_game(screen, result):
-    screen.fill((255, 255, 255))
-    pygame.display.flip()
-
-    # Initialize ending screen fonts
-    ending_font = pygame.font.Font(None, 100)
-    button_font = pygame.font.Font(None, 60)
-
-    if result == "won":
-        # Player wins the sudoku game
-        winner_surface = ending_font.render('Game Won!', True, (0, 0, 0))
-        screen.blit(winner_surface, (275, 350))
-    else:
-        # Player loses the sudoku game
-        loser_surface = ending_font.render('Game Over :(', True, (0, 0, 0))
-        screen.blit(loser_surface, (260, 350))
-
-    # Exit button
-    exit_button_surface = pygame.Surface((250, 150))
-    pygame.draw.rect(exit_button_surface, (0, 0, 0), exit_button_surface.get_rect(), 3)
-    exit_text = button_font.render('EXIT', True, (255, 255, 255))
-    exit_rect = exit_text.get_rect(center=(exit_button_surface.get_width() / 2, exit_button_surface.get_height() / 2))
-    exit_button_surface.blit(exit_text, exit_rect)
-    exit_button_rect = pygame.Rect(350, 550, 250, 150)
-    screen.blit(exit_button_surface, (350, 550))
-
-    # Restart button
-    res_button_surface = pygame.Surface((250, 150))
-    pygame.draw.rect(res_button_surface, (0, 0, 0), res_button_surface.get_rect(), 3)
-    res_text = button_font.render('RESTART', True, (255, 255, 255))
-    res_rect = res_text.get_rect(center=(res_button_surface.get_width() / 2, res_button_surface.get_height() / 2))
-    res_button_surface.blit(res_text, res_rect)
-    res_button_rect = pygame.Rect(350, 750, 250, 150)
-    screen.blit(res_button_surface, (350, 750))
-
-    pygame.display.flip()
-
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                if exit_button_rect.collidepoint(event.pos):
-                    pygame.quit()
-                    sys.exit()
-                elif res_button_rect.collidepoint(event.pos):
-                    main()
+                board.click(*event.pos)
+        elif event.type == pygame.KEYDOWN:
+            if event.mod & pygame.KMOD_CTRL and event.key in (pygame.K_z, pygame.K_y):
+                # Ctrl+Z undoes; Ctrl+Y or Ctrl+Shift+Z redoes
+                if event.key == pygame.K_y or event.mod & pygame.KMOD_SHIFT:
+                    board.redo()
+                else:
+                    board.undo()
+            elif event.mod & pygame.KMOD_CTRL and event.key in (pygame.K_h, pygame.K_a):
+                # Ctrl+H fills one cell, Ctrl+A solves the rest of the board (in the background)
+                board.request_hint('hint' if event.key == pygame.K_h else 'solve')
+                pygame.display.set_caption('Sudoku - thinking...')
+            elif event.key == pygame.K_ESCAPE:
+                get_hint_service().cancel()
+                pygame.display.set_caption('Sudoku')
+            elif pygame.K_1 <= event.key <= pygame.K_9:
+                board.place_number(event.key - pygame.K_0)
+            elif GRID_SIZE > 9 and event.unicode and event.unicode.lower() in 'abcdefghijklmnop':
+                # letters a-p enter 10-25 on the larger boards
+                value = 10 + 'abcdefghijklmnop'.index(event.unicode.lower())
+                if value <= GRID_SIZE:
+                    board.place_number(value)
+            elif event.key == pygame.K_DELETE or event.key == pygame.K_BACKSPACE:
+                board.clear()
+            elif event.key == pygame.K_UP:
+                board.arrow_selection(0, -1)
+            elif event.key == pygame.K_DOWN:
+                board.arrow_selection(0, 1)
+            elif event.key == pygame.K_LEFT:
+                board.arrow_selection(-1, 0)
+            elif event.key == pygame.K_RIGHT:
+                board.arrow_selection(1, 0)
+        elif event.type == JOURNAL_FLUSH_EVENT:
+            self.flush_scheduled = False
+            board.journal.flush()
+        elif event.type == HINT_EVENT:
+            result = event.result
+            if board.update_board(result):
+                pygame.display.set_caption(f'Sudoku - {result.kind}: {result.reason}')
+            else:
+                pygame.display.set_caption('Sudoku')  # the board changed while the search ran
+        return self
+
+    def update(self):
+        # Moves waiting in the journal's batch are written by a timer, so they reach the
+        # disk even if the player stops making moves (the loop is asleep in event.wait)
+        due = self.board.journal.flush_due()
+        if due is not None and not self.flush_scheduled:
+            pygame.time.set_timer(JOURNAL_FLUSH_EVENT, max(1, int(due * 1000)), loops=1)
+            self.flush_scheduled = True
+        # Check for win or loss condition
+        if self.board.is_full():
+            self.board.journal.discard()  # a finished game is not resumable
+            return EndScene(self.screen, "won" if self.board.check_board() else "lost")
+        return self
 
-def draw_buttons(screen):
-    button_font = pygame.font.Font(None, 45)
+    def draw(self):
+        full_redraw = self.board.full_redraw
+        dirty_rects = self.board.draw()
+        if full_redraw:
+            draw_buttons(self.screen)
+        return dirty_rects
+
+class EndScene:
+    # Game won / game over screen with EXIT and RESTART buttons
+    animating = False
 
-    buttons = ['RESET', 'RESTART', 'EXIT']
+    def __init__(self, screen, result):
+        self.screen = screen
+        self.result = result
+        self.exit_button_rect = pygame.Rect(350, 550, 250, 150)
+        self.res_button_rect = pygame.Rect(350, 750, 250, 150)
+        self.drawn = False
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if self.exit_button_rect.collidepoint(event.pos):
+                return None
+            elif self.res_button_rect.collidepoint(event.pos):
+                return TitleScene(self.screen)
+        return self
+
+    def update(self):
+        return self
+
+    def close(self):
+        pass
+
+    def draw(self):
+        if self.drawn:
+            return []
+        self.drawn = True
+        screen = self.screen
+        screen.fill((255, 255, 255))
+        if self.result == "won":
+            # Player wins the sudoku game
+            screen.blit(RENDER_CACHE.text('Game Won!', 100), (275, 350))
+        else:
+            # Player loses the sudoku game
+            screen.blit(RENDER_CACHE.text('Game Over :(', 100), (260, 350))
+        screen.blit(RENDER_CACHE.button('EXIT', 250, 150, 60), self.exit_button_rect.topleft)
+        screen.blit(RENDER_CACHE.button('RESTART', 250, 150, 60), self.res_button_rect.topleft)
+        return [screen.get_rect()]
+
+GAME_BUTTONS = ['RESET', 'RESTART', 'EXIT']
+
+def get_button_rects():
+    # Screen rects of the RESET / RESTART / EXIT buttons under the board
     button_rects = []
 
-    total_button_width = BUTTON_WIDTH * len(buttons)
+    total_button_width = BUTTON_WIDTH * len(GAME_BUTTONS)
     total_spacing = WINDOW_WIDTH - total_button_width
-    spacing = total_spacing // (len(buttons) + 1)
-
-    for i, button_text in enumerate(buttons):
-        button_surface = pygame.Surface((BUTTON_WIDTH, BUTTON_HEIGHT))
-        pygame.draw.rect(button_surface, (0, 0, 0), button_surface.get_rect(), 3)
-        text = button_font.render(button_text, True, (255, 255, 255))
-        text_rect = text.get_rect(center=(button_surface.get_width() / 2, button_surface.get_height() / 2))
-        button_surface.blit(text, text_rect)
+    spacing = total_spacing // (len(GAME_BUTTONS) + 1)
 
+    for i in range(len(GAME_BUTTONS)):
         button_x = spacing * (i + 1) + BUTTON_WIDTH * i
-        button_rect = pygame.Rect(button_x, BOARD_SIZE + 20, BUTTON_WIDTH, BUTTON_HEIGHT)
-        button_rects.append(button_rect)
+        button_rects.append(pygame.Rect(button_x, BOARD_SIZE + 20, BUTTON_WIDTH, BUTTON_HEIGHT))
+    return button_rects
 
+def draw_buttons(screen):
+    button_rects = get_button_rects()
+    for button_text, button_rect in zip(GAME_BUTTONS, button_rects):
+        button_surface = RENDER_CACHE.button(button_text, BUTTON_WIDTH, BUTTON_HEIGHT, 45)
         screen.blit(button_surface, button_rect.topleft)
-
     return button_rects
 
+def switch_scene(scene, next_scene):
+    # Closes scene when the loop leaves it (close saves whatever the scene must not lose)
+    if next_scene is not scene:
+        scene.close()
+    return next_scene
+
+def run(screen, scene):
+    # Single event loop shared by every scene. Each scene returns the scene to switch to
+    # (itself to stay, None to quit). While nothing is animating the loop sleeps in
+    # pygame.event.wait, and it never runs faster than FPS.
+    clock = pygame.time.Clock()
+    while scene is not None:
+        if scene.animating:
+            events = pygame.event.get()
+        else:
+            events = [pygame.event.wait()] + pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                scene.close()
+                return
+            if event.type == pygame.VIDEOEXPOSE:
+                pygame.display.flip()  # window uncovered: push the whole (unchanged) screen again
+                continue
+            scene = switch_scene(scene, scene.handle_event(event))
+            if scene is None:
+                return
+        scene = switch_scene(scene, scene.update())
+        if scene is None:
+            return
+
+        dirty_rects = scene.draw()
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+        clock.tick(FPS)
+
 def main():
     # initializing pygame module, making game window
     pygame.init()
+    if get_puzzle_bank() is None:
+        get_prefetcher()  # start generating puzzles while the player picks a difficulty
     screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    screen.fill((255, 255, 255))
     pygame.display.set_caption('Sudoku')
-
-    # Sudoku title: initialized, rendered, updated to screen
-    title_font = pygame.font.Font(None, 100)
-    title_surface = title_font.render('Sudoku', True, (0, 0, 0))
-    screen.blit(title_surface, (350, 300))
-
-    # Select difficulty message: initialized, rendered, updated to screen
-    difficulty_selection = pygame.font.Font(None, 65)
-    difficulty_surface = difficulty_selection.render('Select Game Mode:', True, (0, 0, 0))
-    screen.blit(difficulty_surface, (265, 450))
-    pygame.display.flip()
-
-    button_font = pygame.font.Font(None, 45)
-
-    # Easy Button
-    easy_button_surface = pygame.Surface((150, 200))
-    pygame.draw.rect(easy_button_surface, (0, 0, 0), easy_button_surface.get_rect(), 3)
-    easy_text = button_font.render('EASY', True, (255, 255, 255))
-    easy_rect = easy_text.get_rect(center=(easy_button_surface.get_width() / 2, easy_button_surface.get_height() / 2))
-    easy_button_surface.blit(easy_text, easy_rect)
-    easy_button_rect = pygame.Rect(75, 600, 150, 200)
-    screen.blit(easy_button_surface, (75, 600))
-
-    # Medium Button
-    med_button_surface = pygame.Surface((150, 200))
-    pygame.draw.rect(med_button_surface, (0, 0, 0), med_button_surface.get_rect(), 3)
-    med_text = button_font.render('MEDIUM', True, (255, 255, 255))
-    med_rect = med_text.get_rect(center=(med_button_surface.get_width() / 2, med_button_surface.get_height() / 2))
-    med_button_surface.blit(med_text, med_rect)
-    med_button_rect = pygame.Rect(375, 600, 150, 200)
-    screen.blit(med_button_surface, (375, 600))
-
-    # Hard Button
-    hard_button_surface = pygame.Surface((150, 200))
-    pygame.draw.rect(hard_button_surface, (0, 0, 0), hard_button_surface.get_rect(), 3)
-    hard_text = button_font.render('HARD', True, (255, 255, 255))
-    hard_rect = hard_text.get_rect(center=(hard_button_surface.get_width() / 2, hard_button_surface.get_height() / 2))
-    hard_button_surface.blit(hard_text, hard_rect)
-    hard_button_rect = pygame.Rect(675, 600, 150, 200)
-    screen.blit(hard_button_surface, (675, 600))
-    pygame.display.flip()
-
-    # Main loop
-    running = True
-    while running:
-        for event in pygame.event.get():
-            # checks for specific quit event
-            if event.type == pygame.QUIT:
-                running = False
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                if easy_button_rect.collidepoint(event.pos):
-                    screen.fill((255, 255, 255))
-                    pygame.display.flip()
-                    start_game(screen, 'easy')
-                elif med_button_rect.collidepoint(event.pos):
-                    screen.fill((255, 255, 255))
-                    pygame.display.flip()
-                    start_game(screen, 'medium')
-                elif hard_button_rect.collidepoint(event.pos):
-                    screen.fill((255, 255, 255))
-                    pygame.display.flip()
-                    start_game(screen, 'hard')
-
+    RENDER_CACHE.prerender_digits()
+    # every event type is allowed by default: block them all, then allow only what the scenes use,
+    # so mouse motion and window events never wake the idle loop
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.VIDEOEXPOSE, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, HINT_EVENT,
+                              JOURNAL_FLUSH_EVENT])
+
+    run(screen, TitleScene(screen))
+    if _hint_service is not None:
+        _hint_service.stop()
+    if _prefetcher is not None:
+        _prefetcher.stop()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # optional board size argument, e.g. `python3 sudoku_gui.py 16`
+    if len(sys.argv) > 1:
+        set_grid_size(int(sys.argv[1]))
+    main()
@@ -0,0 +1,257 @@
+import threading,time
+from collections import OrderedDict
+from sudoku_board import unflatten
+from sudoku_solver import SearchCancelled, build_masks, solve_and_count
+
+"""
+Background hints and auto-solve for a game in progress, so the GUI thread never runs a search.
+
+A request snapshots the board and returns at once. When every entry agrees with the
+board's stored solution, the answer is read straight off it. Otherwise contradictions that
+need no search (a digit repeated in a row, column or box, or an empty cell with no
+candidates left) are reported straight away, and anything else goes to a worker thread that
+solves the snapshot within a time budget; a board is only called unsolvable once a search
+proves it, since entries that differ from the stored solution may still belong to another
+solution of the puzzle. Results are memoized by board state and passed to a notify callback
+(the GUI posts them as a pygame event). A new request cancels the one still running, and
+results for a superseded request are dropped.
+
+"""
+
+HINT_TIME_BUDGET = 2.0  # seconds a search may run before it is reported as timed out
+CACHE_SIZE = 256  # board states whose solutions are memoized
+
+'''
+The answer to one request
+
+self.request	- the id returned by HintService.request
+self.kind		- 'hint' or 'solve'
+self.state		- the board values (flat bytes) the request was made on
+self.status		- 'ok', 'unsolvable' or 'timeout'
+self.solution	- flat bytes solving state (None unless status is 'ok')
+self.cell		- for a hint, the index of the cell to fill (None otherwise)
+self.value		- for a hint, the value of that cell
+self.cells		- for 'unsolvable', indices of the cells that cause it: entries that clash or
+				  differ from the stored solution, or empty cells with no candidates left
+self.reason		- short description of the status
+self.elapsed	- seconds from the request to the result
+'''
+class HintResult:
+    def __init__(self, request, kind, state, status, solution=None, cell=None, value=None, cells=(), reason='', elapsed=0.0):
+        self.request = request
+        self.kind = kind
+        self.state = state
+        self.status = status
+        self.solution = solution
+        self.cell = cell
+        self.value = value
+        self.cells = list(cells)
+        self.reason = reason
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f'HintResult({self.kind} #{self.request}: {self.status}, {self.reason})'
+
+'''
+Returns the cells that make a board unsolvable without any search, or None if there are none
+
+Parameters:
+board is a SudokuBoard
+
+Return: (reason, list of cell indices) or None
+'''
+def find_contradiction(board):
+    clashes = [i for i, conflict in enumerate(board.conflicts) if conflict]
+    if clashes:
+        return 'repeated digits', clashes
+    size = board.size
+    rows, cols, boxes, empties = build_masks(unflatten(board.values, size))
+    full = ((1 << size) - 1) << 1
+    dead = [row * size + col for row, col, box in empties if not full & ~(rows[row] | cols[col] | boxes[box])]
+    if dead:
+        return 'no candidates left', dead
+    return None
+
+'''
+Returns the cells whose entries differ from the stored solution (empty if it is not known)
+'''
+def wrong_entries(board):
+    if board.solution_cells is None:
+        return []
+    return [i for i, value in enumerate(board.values)
+            if value and not board.initial[i] and value != board.solution_cells[i]]
+
+'''
+Picks the cell a hint should fill: the selected cell if it is empty, otherwise the empty
+cell with the fewest candidates (the most constrained, usually the easiest to reason out)
+
+Parameters:
+state is the flat board values
+size is the number of rows/columns of the board
+selected is the index of the selected cell, or None
+
+Return: int (cell index) or None if the board is full
+'''
+def pick_hint_cell(state, size, selected=None):
+    if selected is not None and state[selected] == 0:
+        return selected
+    rows, cols, boxes, empties = build_masks(unflatten(state, size))
+    full = ((1 << size) - 1) << 1
+    best = None
+    best_count = size + 1
+    for row, col, box in empties:
+        count = bin(full & ~(rows[row] | cols[col] | boxes[box])).count('1')
+        if count < best_count:
+            best, best_count = row * size + col, count
+    return best
+
+'''
+Runs hint and solve requests on a worker thread
+
+self.time_budget	- seconds allowed per search
+self.notify			- called with every HintResult, from the worker thread or from request()
+self.cache			- OrderedDict of board state -> solution (flat bytes, or None if unsolvable), least recent first
+self.stored		- requests answered from the board's stored solution (every entry agreed with it)
+self.hits			- requests answered from the cache
+self.searches		- searches run
+self.cancelled		- searches stopped because a newer request (or cancel) superseded them
+'''
+class HintService:
+    def __init__(self, notify, time_budget=HINT_TIME_BUDGET, cache_size=CACHE_SIZE):
+        self.notify = notify
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.stored = 0
+        self.hits = 0
+        self.searches = 0
+        self.cancelled = 0
+        self.lock = threading.Lock()
+        self.job = None
+        self.latest = 0
+        self.cancel_event = threading.Event()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    '''
+    Starts the worker thread (does nothing if it is already running)
+    '''
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='hint-service', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.cancel()
+        self.wakeup.set()
+
+    '''
+    Cancels the pending or running request, if any; its result is never delivered
+    '''
+    def cancel(self):
+        with self.lock:
+            self.latest += 1
+            self.job = None
+            self.cancel_event.set()
+
+    '''
+    Asks for a hint or a full solution of the board's current state
+
+	Parameters:
+	board is the SudokuBoard (only a snapshot of its values is used)
+	kind is 'hint' (one cell) or 'solve' (every empty cell)
+	selected is the index of the selected cell, preferred for a hint when it is empty
+
+	Return: int (the request id, matching HintResult.request)
+    '''
+    def request(self, board, kind='hint', selected=None):
+        start = time.perf_counter()
+        state = board.snapshot()
+        self.cancel()
+        with self.lock:
+            request = self.latest
+
+        if board.solution_cells is not None and not wrong_entries(board):
+            # the stored solution also solves this state: no search needed
+            self.stored += 1
+            self.deliver(self.result(request, kind, state, board.size, selected, board.solution_cells, [], start))
+            return request
+
+        contradiction = find_contradiction(board)
+        if contradiction is not None:
+            reason, cells = contradiction
+            self.deliver(HintResult(request, kind, state, 'unsolvable', cells=sorted(set(cells) | set(wrong_entries(board))),
+                                    reason=reason, elapsed=time.perf_counter() - start))
+            return request
+
+        with self.lock:
+            cached = state in self.cache
+            if cached:
+                self.cache.move_to_end(state)
+                solution = self.cache[state]
+        if cached:
+            self.hits += 1
+            self.deliver(self.result(request, kind, state, board.size, selected, solution, wrong_entries(board), start))
+            return request
+
+        with self.lock:
+            self.cancel_event = threading.Event()
+            self.job = (request, kind, state, board.size, selected, wrong_entries(board), start, self.cancel_event)
+        self.wakeup.set()
+        return request
+
+    '''
+    Builds the result of a request from the solution of its state (None if there is none)
+    '''
+    def result(self, request, kind, state, size, selected, solution, wrong, start):
+        elapsed = time.perf_counter() - start
+        if solution is None:
+            return HintResult(request, kind, state, 'unsolvable', cells=wrong, reason='no solution from here', elapsed=elapsed)
+        if kind == 'solve':
+            return HintResult(request, kind, state, 'ok', solution, reason='solved', elapsed=elapsed)
+        cell = pick_hint_cell(state, size, selected)
+        if cell is None:
+            return HintResult(request, kind, state, 'ok', solution, reason='board is full', elapsed=elapsed)
+        return HintResult(request, kind, state, 'ok', solution, cell, solution[cell],
+                          reason=f'{solution[cell]} at row {cell // size + 1}, column {cell % size + 1}', elapsed=elapsed)
+
+    '''
+    Passes a result on unless a newer request (or cancel) has superseded it
+    '''
+    def deliver(self, result):
+        with self.lock:
+            current = result.request == self.latest
+        if current:
+            self.notify(result)
+
+    '''
+    Worker loop: solves the latest request, then sleeps until the next one
+    '''
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                job, self.job = self.job, None
+            if job is None:
+                continue
+            request, kind, state, size, selected, wrong, start, cancel = job
+            self.searches += 1
+            try:
+                count, solution = solve_and_count(unflatten(state, size), 1, time.perf_counter() + self.time_budget, cancel)
+            except SearchCancelled:
+                self.cancelled += 1
+                continue
+            except TimeoutError:
+                self.deliver(HintResult(request, kind, state, 'timeout', reason='search timed out',
+                                        elapsed=time.perf_counter() - start))
+                continue
+            solution = bytes(value for row in solution for value in row) if count else None
+            with self.lock:
+                self.cache[state] = solution
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            self.deliver(self.result(request, kind, state, size, selected, solution, wrong, start))
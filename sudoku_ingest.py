@@ -0,0 +1,209 @@
+import argparse,json,math,mmap,multiprocessing,os,sys,time
+from collections import deque
+import numpy as np
+from sudoku_board import unflatten
+from sudoku_cli import Throughput, decode_cells, encode_cells
+from sudoku_solver import solve_and_count
+from sudoku_validate import validate_batch
+
+"""
+Streaming ingest of large puzzle files (one puzzle per line, e.g. 81 characters for 9x9).
+
+python3 sudoku_ingest.py dump.txt --output solved.jsonl --workers 4
+
+The input is memory-mapped and cut into chunks of about CHUNK_BYTES that end on a line
+break. Only the (start, end) offsets of a chunk travel to a worker process, which reads
+and parses the lines from its own mapping of the file, solves each puzzle (counting up to
+two solutions) and verifies the solutions. Results are written in input order as they
+come back, with at most a few chunks in flight per worker, so memory use does not grow
+with the size of the input.
+
+"""
+
+CHUNK_BYTES = 1 << 20
+IN_FLIGHT_PER_WORKER = 2  # chunks queued per worker; bounds memory and keeps workers busy
+
+'''
+Yields (start, end) byte ranges of a file that each hold whole lines, about chunk_bytes long
+'''
+def chunk_ranges(path, chunk_bytes=CHUNK_BYTES):
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            while start < size:
+                end = data.find(b'\n', min(start + chunk_bytes, size) - 1)
+                end = size if end < 0 else end + 1
+                yield start, end
+                start = end
+
+'''
+Returns the puzzle field of an input line, or None for blank and comment ('#') lines
+Dumps often carry extra fields after the puzzle (a rating, a solution), separated by a
+comma or whitespace; only the first field is read
+'''
+def puzzle_field(line):
+    fields = line.replace(b',', b' ').split(None, 1)
+    if not fields or fields[0].startswith(b'#'):
+        return None
+    return fields[0].decode('latin-1')
+
+'''
+Solves one puzzle and returns its result record (without the line number)
+'''
+def solve_record(text, time_budget):
+    try:
+        cells = decode_cells(text)
+    except ValueError as e:
+        return {'puzzle': text, 'solution': None, 'solutions': 0, 'error': str(e)}
+    size = math.isqrt(len(cells))
+    start = time.perf_counter()
+    deadline = start + time_budget if time_budget is not None else None
+    try:
+        solutions, solution = solve_and_count(unflatten(cells, size), 2, deadline)
+    except TimeoutError:
+        return {'puzzle': text, 'solution': None, 'solutions': 0, 'error': 'timed out',
+                'ms': round((time.perf_counter() - start) * 1000, 3)}
+    return {
+        'puzzle': text,
+        'solution': encode_cells(bytes(value for row in solution for value in row)) if solution else None,
+        'solutions': solutions,
+        'ms': round((time.perf_counter() - start) * 1000, 3),
+        'cells': cells,
+    }
+
+'''
+Checks the solutions in records with one validate_batch call per board size: each must be a
+valid board that keeps every given of its puzzle. Sets 'verified' on every solved record
+'''
+def verify_records(records):
+    by_size = {}
+    for record in records:
+        if record['solution'] is not None:
+            by_size.setdefault(len(record['cells']), []).append(record)
+    for cells, group in by_size.items():
+        size = math.isqrt(cells)
+        puzzles = np.frombuffer(b''.join(record['cells'] for record in group), dtype=np.uint8).reshape(-1, size, size)
+        solutions = np.frombuffer(b''.join(decode_cells(record['solution']) for record in group),
+                                  dtype=np.uint8).reshape(-1, size, size)
+        keeps_givens = ((puzzles == 0) | (puzzles == solutions)).all(axis=(1, 2))
+        for record, ok in zip(group, validate_batch(solutions).valid & keeps_givens):
+            record['verified'] = bool(ok)
+
+# set in each worker process by init_ingest_worker
+worker_data = None
+
+'''
+Maps the input file once per worker process
+'''
+def init_ingest_worker(path):
+    global worker_data
+    with open(path, 'rb') as f:
+        worker_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+'''
+Parses and solves the lines of one chunk inside a worker process
+
+Parameters:
+task is (start, end, time_budget) - the chunk's byte range and the seconds allowed per puzzle
+
+Return: (lines, records) - the number of lines in the chunk, and a list of (line index
+within the chunk, record) for every puzzle line
+'''
+def ingest_chunk(task):
+    start, end, time_budget = task
+    lines = worker_data[start:end].splitlines()
+    records = []
+    for index, line in enumerate(lines):
+        text = puzzle_field(line)
+        if text is not None:
+            records.append((index, solve_record(text, time_budget)))
+    verify_records([record for _, record in records])
+    for _, record in records:
+        record.pop('cells', None)
+    return len(lines), records
+
+'''
+Solves every puzzle of a file and streams one result per puzzle to output
+
+Parameters:
+path is the input file, one puzzle per line (see puzzle_field)
+output is a writable text file
+workers is the number of processes (defaults to os.cpu_count(); 1 runs in this process)
+time_budget is the optional number of seconds allowed per puzzle
+line_format writes only the solution (an empty line if there is none) instead of a JSON record
+chunk_bytes is the approximate size of the chunks handed to workers
+
+Return: dict of totals - puzzles, unique, multiple, unsolvable, errors, unverified
+'''
+def ingest(path, output, workers=None, time_budget=None, line_format=False, chunk_bytes=CHUNK_BYTES):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    totals = {'puzzles': 0, 'unique': 0, 'multiple': 0, 'unsolvable': 0, 'errors': 0, 'unverified': 0}
+    progress = Throughput('ingested')
+    line_base = 0
+
+    def write_chunk(result):
+        nonlocal line_base
+        lines, records = result
+        for index, record in records:
+            totals['puzzles'] += 1
+            if 'error' in record:
+                totals['errors'] += 1
+            elif record['solutions'] == 0:
+                totals['unsolvable'] += 1
+            else:
+                totals['unique' if record['solutions'] == 1 else 'multiple'] += 1
+                if not record.get('verified'):
+                    totals['unverified'] += 1
+            if line_format:
+                output.write((record['solution'] or '') + '\n')
+            else:
+                output.write(json.dumps({'line': line_base + index + 1, **record}) + '\n')
+            progress.tick()
+        line_base += lines
+
+    if os.path.getsize(path) == 0:
+        # nothing to solve, and an empty file cannot be memory-mapped
+        progress.report()
+        return totals
+    tasks = ((start, end, time_budget) for start, end in chunk_ranges(path, chunk_bytes))
+    if workers <= 1:
+        init_ingest_worker(path)
+        for task in tasks:
+            write_chunk(ingest_chunk(task))
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_ingest_worker, initargs=(path,))
+        try:
+            # a bounded window of chunks in flight, written strictly in input order
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(ingest_chunk, (task,)))
+                if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                    write_chunk(pending.popleft().get())
+            while pending:
+                write_chunk(pending.popleft().get())
+        finally:
+            pool.terminate()
+            pool.join()
+    progress.report()
+    return totals
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve and verify every puzzle of a large puzzle file.')
+    parser.add_argument('input', help='puzzle file, one puzzle per line')
+    parser.add_argument('--output', default='-', help='result file (default: stdout)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU; 1 runs in-process)')
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds allowed per puzzle')
+    parser.add_argument('--format', choices=['jsonl', 'line'], default='jsonl')
+    parser.add_argument('--chunk-bytes', type=int, default=CHUNK_BYTES, help='approximate input bytes per worker task')
+    args = parser.parse_args()
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        totals = ingest(args.input, output, args.workers, args.time_budget, args.format == 'line', args.chunk_bytes)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(', '.join(f'{count} {name}' for name, count in totals.items()), file=sys.stderr)
@@ -0,0 +1,273 @@
+import atexit,math,os,struct,time
+from sudoku_board import SudokuBoard
+
+"""
+Move journal for a game in progress: undo/redo and an append-only session file.
+
+Every edit is stored as one fixed-size delta (cell index, kind, old value, new value) in a
+flat bytearray, so a long session costs a few bytes per move and never a board snapshot.
+Undo and redo move a cursor over the deltas and apply one step at a time; a step is one
+move, or several deltas joined together (reset_to_original clears many cells in one step).
+
+The session file starts with a header holding the board size, the difficulty name, the
+puzzle and its solution, followed by the same records plus undo/redo markers, appended in
+batches. resume_journal replays it to rebuild the board and its full undo/redo history.
+Pending records are written once FLUSH_RECORDS pile up or FLUSH_SECONDS pass (the caller
+calls flush when it goes idle, see flush_due), and on close and interpreter exit. A new
+session is written next to the path (path + NEW_SUFFIX) and only replaces the file there once
+its first move is written, so starting a game does not wipe a saved one that is never played.
+
+"""
+
+RECORD = struct.Struct('<HBBB')  # cell index, kind, old value, new value
+VALUE, SKETCH, UNDO, REDO = 0, 1, 2, 3  # record kinds
+JOINED = 0x80  # kind flag: the delta belongs to the same step as the one before it
+JOURNAL_MAGIC = b'SDKJ\x02\x00\x00\x00'
+HEADER = struct.Struct('<H16s')  # board size and difficulty name, followed by the puzzle and solution cells
+FLUSH_RECORDS = 64  # pending records that trigger a write
+FLUSH_SECONDS = 2.0  # pending records are written at most this long after the batch started
+NEW_SUFFIX = '.new'  # a new session file is written under path + NEW_SUFFIX until its first move
+
+'''
+Records the edits made to a SudokuBoard and undoes/redoes them
+
+self.board		- the SudokuBoard being edited
+self.moves		- bytearray of RECORD deltas, applied ones first, then the redo history
+self.cursor		- number of applied deltas
+self.path		- the session file (None keeps the journal in memory only)
+self.new_path	- where a new session is written until its first move replaces self.path (None after that)
+self.difficulty	- the difficulty name stored in the session file (or None)
+self.pending	- bytearray of records not yet written to the session file
+'''
+class MoveJournal:
+    def __init__(self, board, path=None, difficulty=None):
+        self.board = board
+        self.difficulty = difficulty
+        self.moves = bytearray()
+        self.cursor = 0
+        self.path = path
+        self.pending = bytearray()
+        self.file = None
+        self.new_path = None
+        self.last_flush = time.monotonic()
+        if path is not None:
+            cells = bytes(board.values[i] if board.initial[i] else 0 for i in range(board.size * board.size))
+            self.new_path = path + NEW_SUFFIX
+            self.file = open(self.new_path, 'wb')
+            name = (difficulty or '').encode()
+            self.file.write(JOURNAL_MAGIC + HEADER.pack(board.size, name) + cells + bytes(board.solution_cells))
+            self.file.flush()
+            # a normal exit (including sys.exit) writes the last batch
+            atexit.register(self.flush)
+
+    def can_undo(self):
+        return self.cursor > 0
+
+    def can_redo(self):
+        return self.cursor * RECORD.size < len(self.moves)
+
+    '''
+    Sets a cell's value through the journal
+
+	Parameters:
+	row and col are the row index and col index of the cell
+	value is the new value (0 to clear)
+	joined makes this delta part of the previous step
+
+	Return: boolean (whether the value changed)
+    '''
+    def set_value(self, row, col, value, joined=False):
+        i = self.board.index(row, col)
+        old = self.board.values[i]
+        if not self.board.set_value(row, col, value):
+            return False
+        self.record(i, VALUE | (JOINED if joined else 0), old, value)
+        return True
+
+    '''
+    Sets a cell's sketch through the journal, see set_value
+    '''
+    def set_sketch(self, row, col, value, joined=False):
+        i = self.board.index(row, col)
+        old = self.board.sketches[i]
+        if not self.board.set_sketch(row, col, value):
+            return False
+        self.record(i, SKETCH | (JOINED if joined else 0), old, value)
+        return True
+
+    '''
+    Clears every cell that was not part of the original puzzle, as one undoable step
+    '''
+    def reset_to_original(self):
+        size = self.board.size
+        joined = False
+        for i, value in enumerate(self.board.values):
+            if value != 0 and not self.board.initial[i]:
+                joined = self.set_value(i // size, i % size, 0, joined) or joined
+
+    '''
+    Appends a delta after the applied ones, dropping the redo history
+    '''
+    def record(self, i, kind, old, new):
+        del self.moves[self.cursor * RECORD.size:]
+        delta = RECORD.pack(i, kind, old, new)
+        self.moves += delta
+        self.cursor += 1
+        self.write(delta)
+
+    '''
+    Applies one delta to the board, in either direction
+    '''
+    def apply(self, i, kind, value):
+        row, col = divmod(i, self.board.size)
+        if kind & ~JOINED == VALUE:
+            self.board.set_value(row, col, value)
+        else:
+            self.board.set_sketch(row, col, value)
+
+    '''
+    Reverts the last step
+
+	Return: boolean (False if there was nothing to undo)
+    '''
+    def undo(self, log=True):
+        if not self.cursor:
+            return False
+        while self.cursor:
+            self.cursor -= 1
+            i, kind, old, new = RECORD.unpack_from(self.moves, self.cursor * RECORD.size)
+            self.apply(i, kind, old)
+            if not kind & JOINED:
+                break
+        if log:
+            self.write(RECORD.pack(0, UNDO, 0, 0))
+        return True
+
+    '''
+    Re-applies the last undone step
+
+	Return: boolean (False if there was nothing to redo)
+    '''
+    def redo(self, log=True):
+        if not self.can_redo():
+            return False
+        end = len(self.moves) // RECORD.size
+        while True:
+            i, kind, old, new = RECORD.unpack_from(self.moves, self.cursor * RECORD.size)
+            self.apply(i, kind, new)
+            self.cursor += 1
+            if self.cursor == end or not self.moves[self.cursor * RECORD.size + 2] & JOINED:
+                break
+        if log:
+            self.write(RECORD.pack(0, REDO, 0, 0))
+        return True
+
+    '''
+    Queues a record for the session file, writing the batch once it is big or old enough
+    '''
+    def write(self, record):
+        if self.file is None:
+            return
+        if not self.pending:
+            self.last_flush = time.monotonic()  # the batch starts with its first record
+        self.pending += record
+        if len(self.pending) >= FLUSH_RECORDS * RECORD.size or self.flush_due() <= 0:
+            self.flush()
+
+    '''
+    Returns the seconds until the pending batch should be written (0 or less: now), or None
+    if nothing is pending; a caller that goes idle should flush once this runs out
+    '''
+    def flush_due(self):
+        if not self.pending:
+            return None
+        return self.last_flush + FLUSH_SECONDS - time.monotonic()
+
+    def flush(self):
+        if self.file is not None and not self.file.closed and self.pending:
+            self.file.write(self.pending)
+            self.file.flush()
+            self.pending = bytearray()
+            if self.new_path is not None:
+                # the first move is on disk: the new session takes over from any saved one
+                os.replace(self.new_path, self.path)
+                self.new_path = None
+        self.last_flush = time.monotonic()
+
+    '''
+    Writes the pending records and closes the session file; a new session without any
+    moves is deleted, leaving the file at self.path as it was
+    '''
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            atexit.unregister(self.flush)
+            if self.new_path is not None and os.path.exists(self.new_path):
+                os.remove(self.new_path)
+                self.new_path = None
+
+    '''
+    Closes the journal and deletes its session file (for a finished game)
+    '''
+    def discard(self):
+        replaced = self.new_path is None
+        self.close()
+        if replaced and self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+'''
+Rebuilds a game from a session file and keeps journaling to it
+
+Parameters:
+path is a file written by a MoveJournal
+board is an optional SudokuBoard to load the game into (it must have the file's size);
+a new one is made if it is None
+
+Return: MoveJournal (its board is the resumed game)
+'''
+def resume_journal(path, board=None):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        raise ValueError(f'{path} is not a session journal')
+    start = len(JOURNAL_MAGIC) + HEADER.size
+    try:
+        size, name = HEADER.unpack_from(data, len(JOURNAL_MAGIC))
+    except struct.error:
+        raise ValueError(f'{path} is truncated') from None
+    cells = size * size
+    if size == 0 or math.isqrt(size) ** 2 != size:
+        raise ValueError(f'{path} has a damaged header')
+    if len(data) < start + 2 * cells:
+        raise ValueError(f'{path} is truncated')
+    if max(data[start:start + 2 * cells]) > size:
+        raise ValueError(f'{path} has a damaged header')
+    if board is None:
+        board = SudokuBoard(size)
+    elif board.size != size:
+        raise ValueError(f'{path} holds a {size}x{size} game, not {board.size}x{board.size}')
+    board.load_flat(data[start:start + cells], data[start + cells:start + 2 * cells])
+
+    journal = MoveJournal(board)
+    journal.difficulty = name.rstrip(b'\0').decode('ascii', 'replace') or None
+    start += 2 * cells
+    usable = start + (len(data) - start) // RECORD.size * RECORD.size  # ignore a torn final write
+    for offset in range(start, usable, RECORD.size):
+        i, kind, old, new = RECORD.unpack_from(data, offset)
+        if kind & ~JOINED not in (VALUE, SKETCH, UNDO, REDO) or i >= cells or old > size or new > size:
+            raise ValueError(f'{path} has a damaged record at byte {offset}')
+        if kind == UNDO:
+            journal.undo(log=False)
+        elif kind == REDO:
+            journal.redo(log=False)
+        else:
+            journal.record(i, kind, old, new)
+            journal.apply(i, kind, new)
+
+    journal.path = path
+    journal.file = open(path, 'r+b')
+    journal.file.seek(usable)
+    journal.file.truncate()
+    atexit.register(journal.flush)
+    return journal
@@ -0,0 +1,128 @@
+import multiprocessing,queue,threading
+from sudoku_generator import generate_sudoku
+
+"""
+Background puzzle prefetching, so starting or restarting a game never waits on generate_sudoku.
+A daemon thread keeps a small queue of ready puzzles for every difficulty and refills
+a queue as soon as a puzzle is taken from it. The puzzles are generated in a worker
+process: the thread only waits on it, so it never competes with the caller (the GUI's
+render loop) for the GIL.
+
+If a queue is empty when a puzzle is asked for, get waits up to MISS_WAIT seconds for the
+producer, then generates the puzzle on the caller's thread with removal capped at
+MISS_TIME_BUDGET seconds: the puzzle keeps the uniqueness guarantee (it may just have fewer
+cells removed) and the caller never waits for a full-length generation.
+
+"""
+
+MISS_WAIT = 0.25  # seconds get waits for the producer before generating a puzzle itself
+MISS_TIME_BUDGET = 0.25  # seconds of unique removal allowed for a puzzle generated on a miss
+
+'''
+Keeps a bounded queue of ready (board, solution) puzzles per difficulty
+
+self.size		- the number of rows/columns of the boards
+self.levels		- dict of difficulty name -> number of cells to remove
+self.queues		- dict of difficulty name -> queue.Queue of ready puzzles
+self.unique		- passed to generate_sudoku (keep puzzles uniquely solvable)
+self.time_budget	- passed to generate_sudoku (seconds allowed for unique removal)
+self.hits		- puzzles served from a queue (possibly after waiting up to MISS_WAIT)
+self.misses		- puzzles generated on the caller's thread (see MISS_TIME_BUDGET) because the queue stayed empty
+self.pool		- multiprocessing.Pool of one worker process the producer generates in (created by start)
+'''
+class PuzzlePrefetcher:
+    def __init__(self, size, levels, depth=4, unique=False, time_budget=None):
+        self.size = size
+        self.levels = dict(levels)
+        self.queues = {name: queue.Queue(depth) for name in self.levels}
+        self.unique = unique
+        self.time_budget = time_budget
+        self.hits = 0
+        self.misses = 0
+        self.pool = None
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    '''
+    Starts the producer thread (does nothing if it is already running)
+    '''
+    def start(self):
+        if self.thread is None:
+            # spawn, not fork: a forked copy of a process running pygame/SDL can misbehave
+            # (and ignore the SIGTERM that stop sends)
+            self.pool = multiprocessing.get_context('spawn').Pool(1)
+            self.thread = threading.Thread(target=self.run, name='puzzle-prefetch', daemon=True)
+            self.thread.start()
+        return self
+
+    '''
+    Asks the producer thread to exit and stops the worker process, abandoning its puzzle
+    '''
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.pool is not None:
+            self.pool.terminate()
+
+    '''
+    Generates one puzzle for the given difficulty in the worker process
+    Returns None if the prefetcher is stopped meanwhile
+    '''
+    def generate(self, difficulty):
+        result = self.pool.apply_async(generate_sudoku, (self.size, self.levels[difficulty], self.unique, self.time_budget))
+        while not result.ready():
+            if self.stopped.is_set():
+                return None
+            result.wait(0.1)
+        return result.get()
+
+    '''
+    Producer loop: tops up every queue that has room, then sleeps until a puzzle is taken
+    '''
+    def run(self):
+        while not self.stopped.is_set():
+            produced = False
+            for name, ready in self.queues.items():
+                if self.stopped.is_set():
+                    return
+                if not ready.full():
+                    puzzle = self.generate(name)
+                    if puzzle is None:
+                        return
+                    ready.put(puzzle)
+                    produced = True
+            if not produced:
+                self.wakeup.wait()
+                self.wakeup.clear()
+
+    '''
+    Returns a ready puzzle for difficulty; if its queue stays empty for MISS_WAIT seconds,
+    generates one on the calling thread with unique removal capped at MISS_TIME_BUDGET
+
+	Parameters:
+	difficulty is the difficulty name, e.g. 'easy'
+
+	Return: (board, solution)
+    '''
+    def get(self, difficulty):
+        self.wakeup.set()
+        try:
+            puzzle = self.queues[difficulty].get(timeout=MISS_WAIT)
+            self.hits += 1
+        except queue.Empty:
+            self.misses += 1
+            budget = MISS_TIME_BUDGET if self.time_budget is None else min(self.time_budget, MISS_TIME_BUDGET)
+            puzzle = generate_sudoku(self.size, self.levels[difficulty], self.unique, budget)
+        self.wakeup.set()
+        return puzzle
+
+    '''
+    Returns the hit/miss counters and how many puzzles are ready per difficulty
+    '''
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'ready': {name: ready.qsize() for name, ready in self.queues.items()},
+        }
@@ -0,0 +1,275 @@
+import argparse,asyncio,json,math,os,sys,time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from sudoku_board import SudokuBoard, flatten
+from sudoku_cli import decode_cells, encode_cells
+from sudoku_generator import difficulty_levels, generate_sudoku_flat
+
+"""
+Local HTTP puzzle server built on asyncio streams (standard library only).
+
+GET  /puzzle?difficulty=easy	a puzzle from the warm pool for that difficulty
+POST /check						validates a submitted grid, see check_grid
+GET  /stats						request counts, p50/p99 latencies and pool levels
+
+Puzzles are generated ahead of time by a process pool into one bounded queue per
+difficulty, so a request only waits on a queue and never runs the generator on the
+event loop. Connections are kept alive (HTTP/1.1) until the client closes them or
+stays idle for IDLE_TIMEOUT seconds.
+
+python3 sudoku_server.py --port 8080
+
+"""
+
+IDLE_TIMEOUT = 30.0
+MAX_BODY = 64 * 1024
+LATENCY_WINDOW = 10000  # latencies kept per endpoint for the percentiles
+ENDPOINTS = ('/puzzle', '/check', '/stats')
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large'}
+
+'''
+Returns a grid from a request body value: a string of cell characters or a 2D list
+Raises ValueError unless its side is a perfect square of at least 4 (so an empty grid is rejected)
+
+Return: bytes (flat cells)
+'''
+def parse_grid(value):
+    if isinstance(value, str):
+        cells = decode_cells(value)
+    elif isinstance(value, list) and all(isinstance(row, list) and len(row) == len(value) for row in value):
+        cells = bytes(flatten(value))
+    else:
+        raise ValueError('a grid must be a string of cells or a square 2D list')
+    size = math.isqrt(len(cells))
+    if size < 4 or size * size != len(cells) or math.isqrt(size) ** 2 != size:
+        raise ValueError(f'{len(cells)} cells is not a sudoku board')
+    if max(cells) > size:
+        raise ValueError('cell value larger than the board size')
+    return cells
+
+'''
+Validates a submitted grid
+
+Parameters:
+grid is the flat grid (bytes)
+puzzle is the flat puzzle it should complete, or None
+
+Return: dict with
+complete	- every cell is filled
+conflicts	- indices of cells whose value repeats in their row, column or box
+matches_puzzle	- every given of puzzle is kept (only when puzzle is passed)
+solved		- complete, conflict free and (if passed) matching the puzzle
+'''
+def check_grid(grid, puzzle=None):
+    size = int(len(grid) ** 0.5)
+    board = SudokuBoard(size)
+    board.values = bytearray(grid)
+    board.rebuild_counts()
+    result = {
+        'complete': board.is_full(),
+        'conflicts': [i for i, conflict in enumerate(board.conflicts) if conflict],
+    }
+    solved = result['complete'] and not result['conflicts']
+    if puzzle is not None:
+        if len(puzzle) != len(grid):
+            raise ValueError('puzzle and grid have different sizes')
+        result['matches_puzzle'] = all(given == 0 or given == value for given, value in zip(puzzle, grid))
+        solved = solved and result['matches_puzzle']
+    result['solved'] = solved
+    return result
+
+'''
+Returns the value at fraction q (0..1) of sorted latencies, in milliseconds
+'''
+def percentile(latencies, q):
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    return round(ordered[int(q * (len(ordered) - 1))] * 1000, 3)
+
+'''
+The server state: warm puzzle pools, the worker processes that refill them, and counters
+
+self.size		- the number of rows/columns of the boards served
+self.levels		- dict of difficulty name -> number of cells to remove
+self.pools		- dict of difficulty name -> asyncio.Queue of ready (puzzle, solution) flat pairs
+self.executor	- ProcessPoolExecutor the generator runs in
+self.latencies	- dict of endpoint -> deque of recent request latencies in seconds
+self.requests	- dict of endpoint -> number of requests served
+self.waits		- /puzzle requests that found their pool empty and had to wait
+'''
+class PuzzleServer:
+    def __init__(self, size=9, depth=16, workers=None, unique=False, time_budget=None):
+        self.size = size
+        self.levels = {name: removed * size * size // 81 for name, removed in difficulty_levels.items()}
+        self.depth = depth
+        self.workers = workers or os.cpu_count() or 1
+        self.unique = unique
+        self.time_budget = time_budget
+        self.pools = {}
+        self.executor = None
+        self.fillers = []
+        self.latencies = {}
+        self.requests = {}
+        self.waits = 0
+
+    '''
+    Starts the worker processes and one refill task per worker slot and difficulty
+    '''
+    async def start(self):
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.pools = {name: asyncio.Queue(self.depth) for name in self.levels}
+        for name in self.levels:
+            for _ in range(max(1, self.workers // len(self.levels))):
+                self.fillers.append(asyncio.create_task(self.refill(name)))
+
+    async def stop(self):
+        for task in self.fillers:
+            task.cancel()
+        await asyncio.gather(*self.fillers, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    '''
+    Keeps one difficulty's pool topped up; put() blocks while the pool is full
+    '''
+    async def refill(self, difficulty):
+        loop = asyncio.get_running_loop()
+        pool = self.pools[difficulty]
+        while True:
+            puzzle = await loop.run_in_executor(self.executor, generate_sudoku_flat, self.size,
+                                                self.levels[difficulty], self.unique, self.time_budget)
+            await pool.put(puzzle)
+
+    def record(self, path, elapsed):
+        endpoint = path if path in ENDPOINTS else 'other'
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'latency_ms': {endpoint: {'p50': percentile(values, 0.5), 'p99': percentile(values, 0.99)}
+                           for endpoint, values in self.latencies.items()},
+            'pool_waits': self.waits,
+            'ready': {name: pool.qsize() for name, pool in self.pools.items()},
+        }
+
+    '''
+    Handles one request and returns (status, body dict)
+    '''
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/puzzle':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            difficulty = parse_qs(url.query).get('difficulty', ['medium'])[0]
+            if difficulty not in self.pools:
+                return 400, {'error': f'difficulty must be one of {", ".join(self.pools)}'}
+            pool = self.pools[difficulty]
+            if pool.empty():
+                self.waits += 1
+            puzzle, solution = await pool.get()
+            return 200, {'difficulty': difficulty, 'puzzle': encode_cells(puzzle), 'solution': encode_cells(solution)}
+        if url.path == '/check':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            try:
+                request = json.loads(body or b'{}')
+                grid = parse_grid(request['grid'])
+                puzzle = parse_grid(request['puzzle']) if request.get('puzzle') is not None else None
+                return 200, check_grid(grid, puzzle)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                return 400, {'error': f'bad request: {e}'}
+        if url.path == '/stats':
+            return 200, self.stats()
+        return 404, {'error': f'no such endpoint {url.path}'}
+
+    '''
+    Serves one client connection, answering requests until it closes or goes idle
+    '''
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'malformed request line'}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, {'error': 'invalid Content-Length'}, False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self.dispatch(method, target, body)
+                await self.respond(writer, status, payload, keep_alive)
+                self.record(urlsplit(target).path, time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+'''
+Runs the server until interrupted
+'''
+async def serve(host, port, **options):
+    server = PuzzleServer(**options)
+    await server.start()
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f'serving puzzles on http://{host}:{port}', file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve sudoku puzzles over local HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--size', type=int, default=9)
+    parser.add_argument('--depth', type=int, default=16, help='ready puzzles kept per difficulty')
+    parser.add_argument('--workers', type=int, default=None, help='generator processes (default: one per CPU)')
+    parser.add_argument('--unique', action='store_true', help='serve only uniquely solvable puzzles')
+    parser.add_argument('--time-budget', type=float, default=None, help='seconds allowed per puzzle for --unique')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, size=args.size, depth=args.depth, workers=args.workers,
+                          unique=args.unique, time_budget=args.time_budget))
+    except KeyboardInterrupt:
+        pass
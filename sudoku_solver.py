@@ -0,0 +1,507 @@
+import math,time,random
+import multiprocessing
+from collections import deque
+
+"""
+Solving engines for (partially filled) boards.
+Works on any N x N board where N is a perfect square (9, 16, 25, ...).
+Boards are 2D lists of ints with 0 marking an empty cell, same as SudokuGenerator.board.
+
+BacktrackEngine - bitmask backtracking with minimum-remaining-values ordering (fast for 9x9)
+ExactCoverEngine - Knuth's Algorithm X on the exact cover form of the board, using
+                   dicts of sets in place of dancing links (scales to 16x16 and 25x25)
+
+"""
+
+'''
+Builds the row, column and box bitmasks for board and the list of empty cells
+Bit num of a mask is set when num is already used in that row/column/box
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+
+Return:
+(rows, cols, boxes, empties) or None if the givens already conflict with each other
+empties is a list of (row, col, box) tuples
+'''
+def build_masks(board):
+    size = len(board)
+    box_length = int(math.sqrt(size))
+    rows = [0] * size
+    cols = [0] * size
+    boxes = [0] * size
+    empties = []
+    for row in range(size):
+        for col in range(size):
+            box = (row // box_length) * box_length + col // box_length
+            num = board[row][col]
+            if num == 0:
+                empties.append((row, col, box))
+                continue
+            bit = 1 << num
+            if (rows[row] | cols[col] | boxes[box]) & bit:
+                return None
+            rows[row] |= bit
+            cols[col] |= bit
+            boxes[box] |= bit
+    return rows, cols, boxes, empties
+
+'''
+Bitmask backtracking search shared by BacktrackEngine.solve and BacktrackEngine.count
+The board itself is not modified
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+limit is the number of solutions after which the search stops
+deadline is an optional time.perf_counter() value; if it passes, TimeoutError is raised
+rng is an optional random.Random - tries candidates in random order when given
+shared is an optional multiprocessing.Value counting solutions across processes (see
+parallel_count_solutions); solutions found are added to it, and the search stops once it reaches limit
+cancel is an optional threading.Event; once it is set, SearchCancelled is raised
+
+Return:
+(count, first) - the number of solutions found (at most limit) and the first one as a 2D list (or None)
+'''
+def backtrack_search(board, limit, deadline=None, rng=None, shared=None, cancel=None):
+    masks = build_masks(board)
+    if masks is None:
+        return 0, None
+    rows, cols, boxes, empties = masks
+    size = len(board)
+    full = ((1 << size) - 1) << 1
+    total = len(empties)
+    values = [0] * total
+    found = 0
+    first = None
+    nodes = 0
+
+    def search(depth):
+        nonlocal found, first, nodes
+        if depth == total:
+            found += 1
+            if first is None:
+                first = [list(row) for row in board]
+                for i in range(total):
+                    first[empties[i][0]][empties[i][1]] = values[i]
+            if shared is not None:
+                return add_shared(shared) >= limit
+            return found >= limit
+        nodes += 1
+        if nodes & 255 == 0:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError('search exceeded its time budget')
+            if shared is not None and shared.value >= limit:
+                return True
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+
+        # pick the empty cell with the fewest candidates (minimum remaining values)
+        best = depth
+        best_options = 0
+        best_count = size + 1
+        for i in range(depth, total):
+            row, col, box = empties[i]
+            options = full & ~(rows[row] | cols[col] | boxes[box])
+            count = bin(options).count('1')
+            if count < best_count:
+                best, best_options, best_count = i, options, count
+                if count <= 1:
+                    break
+        if best_count == 0:
+            return False
+        empties[depth], empties[best] = empties[best], empties[depth]
+        row, col, box = empties[depth]
+
+        bits = []
+        options = best_options
+        while options:
+            bit = options & -options
+            options ^= bit
+            bits.append(bit)
+        if rng is not None:
+            rng.shuffle(bits)
+        for bit in bits:
+            rows[row] |= bit
+            cols[col] |= bit
+            boxes[box] |= bit
+            values[depth] = bit.bit_length() - 1
+            done = search(depth + 1)
+            rows[row] ^= bit
+            cols[col] ^= bit
+            boxes[box] ^= bit
+            if done:
+                return True
+        return False
+
+    search(0)
+    return found, first
+
+'''
+Adds one solution to a shared cross-process counter and returns the new total
+'''
+def add_shared(shared):
+    with shared.get_lock():
+        shared.value += 1
+        return shared.value
+
+'''
+Raised by the searches once their cancel event is set
+'''
+class SearchCancelled(Exception):
+    pass
+
+'''
+Raised by exact_cover_search when max_nodes is exceeded, so the caller can restart
+'''
+class NodeLimitReached(Exception):
+    pass
+
+'''
+Builds (and caches) the exact cover matrix of an empty size x size board
+Every candidate (row, col, num) is a matrix row covering four constraint columns:
+cell (row, col) is filled, row has num, col has num, and box has num
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return:
+dict mapping candidate id (row * size + col) * size + num - 1 to its list of column ids
+'''
+exact_cover_rows = {}
+
+def exact_cover_matrix(size):
+    if size in exact_cover_rows:
+        return exact_cover_rows[size]
+    box_length = int(math.sqrt(size))
+    cells = size * size
+    matrix = {}
+    for row in range(size):
+        for col in range(size):
+            box = (row // box_length) * box_length + col // box_length
+            for n in range(size):
+                matrix[(row * size + col) * size + n] = [
+                    row * size + col,
+                    cells + row * size + n,
+                    2 * cells + col * size + n,
+                    3 * cells + box * size + n,
+                ]
+    exact_cover_rows[size] = matrix
+    return matrix
+
+'''
+Algorithm X search shared by ExactCoverEngine.solve and ExactCoverEngine.count
+Columns are kept as sets of candidate ids; covering a candidate removes every
+candidate that clashes with it, exactly like unlinking nodes in dancing links
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+limit is the number of solutions after which the search stops
+deadline is an optional time.perf_counter() value; if it passes, TimeoutError is raised
+rng is an optional random.Random - tries candidates in random order when given
+max_nodes is an optional cap on search nodes; NodeLimitReached is raised once it is hit
+shared is an optional multiprocessing.Value counting solutions across processes, see backtrack_search
+cancel is an optional threading.Event, see backtrack_search
+
+Return:
+(count, first) - the number of solutions found (at most limit) and the first one as a 2D list (or None)
+'''
+def exact_cover_search(board, limit, deadline=None, rng=None, max_nodes=None, shared=None, cancel=None):
+    size = len(board)
+    matrix = exact_cover_matrix(size)
+    columns = {c: set() for c in range(4 * size * size)}
+    for candidate, cols in matrix.items():
+        for c in cols:
+            columns[c].add(candidate)
+
+    def cover(candidate):
+        removed = []
+        for c in matrix[candidate]:
+            for other in columns[c]:
+                for oc in matrix[other]:
+                    if oc != c:
+                        columns[oc].remove(other)
+            removed.append(columns.pop(c))
+        return removed
+
+    def uncover(candidate, removed):
+        for c in reversed(matrix[candidate]):
+            columns[c] = removed.pop()
+            for other in columns[c]:
+                for oc in matrix[other]:
+                    if oc != c:
+                        columns[oc].add(other)
+
+    for row in range(size):
+        for col in range(size):
+            num = board[row][col]
+            if num == 0:
+                continue
+            candidate = (row * size + col) * size + num - 1
+            # a given that clashes with an earlier given has already been covered away
+            if any(c not in columns or candidate not in columns[c] for c in matrix[candidate]):
+                return 0, None
+            cover(candidate)
+
+    chosen = []
+    found = 0
+    first = None
+    nodes = 0
+
+    def search():
+        nonlocal found, first, nodes
+        if not columns:
+            found += 1
+            if first is None:
+                first = [list(row) for row in board]
+                for candidate in chosen:
+                    cell, n = divmod(candidate, size)
+                    first[cell // size][cell % size] = n + 1
+            if shared is not None:
+                return add_shared(shared) >= limit
+            return found >= limit
+        nodes += 1
+        if nodes & 63 == 0:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError('search exceeded its time budget')
+            if shared is not None and shared.value >= limit:
+                return True
+            if cancel is not None and cancel.is_set():
+                raise SearchCancelled()
+        if max_nodes is not None and nodes > max_nodes:
+            raise NodeLimitReached()
+
+        # branch on the column with the fewest candidates; a forced (or dead) column ends the scan early
+        best = None
+        best_count = size + 1
+        for c, rows in columns.items():
+            if len(rows) < best_count:
+                best, best_count = c, len(rows)
+                if best_count <= 1:
+                    break
+        if best_count == 0:
+            return False
+        candidates = list(columns[best])
+        if rng is not None:
+            rng.shuffle(candidates)
+        else:
+            candidates.sort()
+        for candidate in candidates:
+            chosen.append(candidate)
+            removed = cover(candidate)
+            done = search()
+            uncover(candidate, removed)
+            chosen.pop()
+            if done:
+                return True
+        return False
+
+    search()
+    return found, first
+
+'''
+A solving engine pairs a solve function with a solution counter
+SudokuGenerator picks one by name from ENGINES
+
+solve(board, rng=None, deadline=None) returns a solved copy of board, or None if it has no solution
+count(board, limit=2, deadline=None, shared=None) returns the number of solutions, stopping at limit
+(or once the shared cross-process counter reaches it)
+search(board, limit=2, deadline=None, cancel=None) does both in one pass: (count, first solution or None)
+'''
+class BacktrackEngine:
+    name = 'backtrack'
+
+    def solve(self, board, rng=None, deadline=None):
+        return backtrack_search(board, 1, deadline, rng)[1]
+
+    def count(self, board, limit=2, deadline=None, shared=None):
+        return backtrack_search(board, limit, deadline, shared=shared)[0]
+
+    def search(self, board, limit=2, deadline=None, cancel=None):
+        return backtrack_search(board, limit, deadline, cancel=cancel)
+
+class ExactCoverEngine:
+    name = 'dlx'
+
+    # randomized restarts: a single unlucky early branch can cost minutes on 25x25,
+    # while a fresh random ordering usually finds a solution within a few thousand nodes
+    first_restart = 2000
+    restart_growth = 1.5
+
+    def solve(self, board, rng=None, deadline=None):
+        if rng is None:
+            rng = random.Random(0)
+        max_nodes = self.first_restart
+        while True:
+            try:
+                return exact_cover_search(board, 1, deadline, rng, max_nodes)[1]
+            except NodeLimitReached:
+                max_nodes = int(max_nodes * self.restart_growth)
+
+    def count(self, board, limit=2, deadline=None, shared=None):
+        return exact_cover_search(board, limit, deadline, shared=shared)[0]
+
+    def search(self, board, limit=2, deadline=None, cancel=None):
+        return exact_cover_search(board, limit, deadline, cancel=cancel)
+
+ENGINES = {
+    'backtrack': BacktrackEngine(),
+    'dlx': ExactCoverEngine(),
+}
+
+'''
+Returns the default engine for a board of the given size
+Bitmask backtracking is quickest on 9x9; exact cover wins from 16x16 up
+
+Parameters:
+size is the number of rows/columns of the board
+
+Return: engine object
+'''
+def default_engine(size):
+    return ENGINES['backtrack'] if size <= 9 else ENGINES['dlx']
+
+'''
+Counts the solutions of board, stopping as soon as limit solutions have been found
+The board itself is not modified
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+limit is the number of solutions after which the search stops (2 is enough to prove uniqueness)
+deadline is an optional time.perf_counter() value; if it passes, TimeoutError is raised
+
+Return: int (the number of solutions found, never more than limit)
+'''
+def count_solutions(board, limit=2, deadline=None):
+    return default_engine(len(board)).count(board, limit, deadline)
+
+'''
+Returns a solved copy of board, or None if it has no solution
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+deadline is an optional time.perf_counter() value, see count_solutions
+
+Return: list[list] or None
+'''
+def solve(board, deadline=None):
+    return default_engine(len(board)).solve(board, deadline=deadline)
+
+'''
+Solves board and counts its solutions in a single search (cheaper than solve then count_solutions)
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+limit is the number of solutions after which the search stops
+deadline is an optional time.perf_counter() value, see count_solutions
+cancel is an optional threading.Event; once it is set the search raises SearchCancelled
+
+Return: (count, solution) - count is at most limit, solution is the first one found as a 2D list (or None)
+'''
+def solve_and_count(board, limit=2, deadline=None, cancel=None):
+    return default_engine(len(board)).search(board, limit, deadline, cancel)
+
+'''
+Returns True if board has exactly one solution
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+deadline is an optional time.perf_counter() value, see count_solutions
+
+Return: boolean
+'''
+def has_unique_solution(board, deadline=None):
+    return count_solutions(board, 2, deadline) == 1
+
+'''
+Splits the search for board's solutions into independent subproblems
+Boards are taken breadth first and branched on their most constrained empty cell (one copy
+per candidate) until there are at least pieces boards; every solution of board is a solution
+of exactly one of them, so their counts add up. Dead branches are dropped
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+pieces is the number of subproblems to aim for
+
+Return: list of 2D lists
+'''
+def split_board(board, pieces):
+    size = len(board)
+    full = ((1 << size) - 1) << 1
+    frontier = deque([board])
+    solved = []
+    while frontier and len(frontier) + len(solved) < pieces:
+        sub = frontier.popleft()
+        masks = build_masks(sub)
+        if masks is None:
+            continue
+        rows, cols, boxes, empties = masks
+        if not empties:
+            solved.append(sub)
+            continue
+        best_options = 0
+        best_count = size + 1
+        for row, col, box in empties:
+            options = full & ~(rows[row] | cols[col] | boxes[box])
+            count = bin(options).count('1')
+            if count < best_count:
+                best, best_options, best_count = (row, col), options, count
+        row, col = best
+        for num in range(1, size + 1):
+            if best_options >> num & 1:
+                child = [list(line) for line in sub]
+                child[row][col] = num
+                frontier.append(child)
+    return solved + list(frontier)
+
+# set in each worker process by init_count_worker
+worker_shared = None
+
+def init_count_worker(shared):
+    global worker_shared
+    worker_shared = shared
+
+'''
+Counts the solutions of one subproblem inside a worker process, sharing the running total
+Subproblems picked up after the total reached the limit are skipped
+'''
+def count_piece(task):
+    board, limit, deadline = task
+    if worker_shared.value >= limit:
+        return 0
+    return default_engine(len(board)).count(board, limit, deadline, worker_shared)
+
+'''
+Counts the solutions of board like count_solutions, spreading the search over a process pool
+The search tree is split at a shallow depth (split_board) into many more subproblems than
+workers; idle workers take the next subproblem from the pool's shared task queue, so a
+worker that finishes early steals the remaining work instead of waiting on a slow branch.
+Every worker adds its solutions to a shared counter and all of them stop as soon as it
+reaches limit
+
+Parameters:
+board is a 2D list of ints (0 for empty)
+limit is the number of solutions after which the search stops (2 is enough to prove uniqueness)
+deadline is an optional time.perf_counter() value, see count_solutions
+workers is the number of processes to use (defaults to os.cpu_count(); 1 runs in this process)
+pieces_per_worker is how many subproblems to split into per worker
+
+Return: int (the number of solutions found, never more than limit)
+'''
+def parallel_count_solutions(board, limit=2, deadline=None, workers=None, pieces_per_worker=16):
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1:
+        return count_solutions(board, limit, deadline)
+    pieces = split_board(board, workers * pieces_per_worker)
+    shared = multiprocessing.Value('q', 0)
+    pool = multiprocessing.Pool(workers, initializer=init_count_worker, initargs=(shared,))
+    try:
+        total = 0
+        for found in pool.imap_unordered(count_piece, [(piece, limit, deadline) for piece in pieces]):
+            total += found
+            if total >= limit:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    return min(total, limit)
@@ -0,0 +1,147 @@
+import math,sys
+import numpy as np
+from sudoku_cli import CELL_VALUES
+
+"""
+Vectorized validation of many boards at once with NumPy.
+
+Boards are an integer array of shape (N, size, size) with 0 for empty cells. Every check
+is a handful of array operations over the whole batch, instead of a Python loop per cell,
+and large batches are processed in chunks so memory stays bounded.
+
+"""
+
+CHUNK = 16384  # boards per chunk, to bound the scratch arrays (a few of CHUNK * size**2 * 8 bytes)
+
+'''
+The result of validate_batch; every attribute is a NumPy array indexed by board first
+
+self.rows_ok	- (N, size) bool, row r of board i holds each digit exactly once
+self.cols_ok	- (N, size) bool, same for columns
+self.boxes_ok	- (N, size) bool, same for boxes (numbered left to right, top to bottom)
+self.conflicts	- (N, size, size) bool, the cell's digit appears again in its row, column or box
+self.complete	- (N,) bool, no empty (or out of range) cells
+self.valid		- (N,) bool, every row, column and box is a permutation: a correctly solved board
+'''
+class BatchReport:
+    def __init__(self, rows_ok, cols_ok, boxes_ok, conflicts, complete):
+        self.rows_ok = rows_ok
+        self.cols_ok = cols_ok
+        self.boxes_ok = boxes_ok
+        self.conflicts = conflicts
+        self.complete = complete
+        self.valid = rows_ok.all(axis=1) & cols_ok.all(axis=1) & boxes_ok.all(axis=1)
+
+    '''
+    Returns the (row, col) positions of the conflicting cells of board i
+    '''
+    def conflict_positions(self, i):
+        return [tuple(map(int, position)) for position in np.argwhere(self.conflicts[i])]
+
+'''
+Validates one chunk of boards, see validate_batch
+'''
+def validate_chunk(grids):
+    count, size, _ = grids.shape
+    box_length = math.isqrt(size)
+    slots = size + 1  # one count per value, slot 0 counting empty cells
+    # out of range entries count as empty cells
+    values = np.where((grids >= 0) & (grids <= size), grids, 0).astype(np.intp)
+    rows, cols = np.indices((size, size))
+    boxes = rows // box_length * box_length + cols // box_length
+    board_base = np.arange(count)[:, None, None] * size
+
+    repeated = np.zeros(values.shape, dtype=bool)
+    oks = []
+    for group in (rows, cols, boxes):
+        # one bincount over all boards: slot (board, group, value) of every cell
+        index = (board_base + group) * slots + values
+        counts = np.bincount(index.ravel(), minlength=count * size * slots)
+        oks.append((counts.reshape(count, size, slots)[:, :, 1:] == 1).all(axis=2))
+        # a cell conflicts when its value is counted more than once in one of its groups
+        repeated |= counts[index] > 1
+
+    filled = values != 0
+    return oks[0], oks[1], oks[2], repeated & filled, filled.all(axis=(1, 2))
+
+'''
+Checks a batch of boards: which rows, columns and boxes are permutations of 1..size,
+which cells conflict, and which boards are complete and valid
+
+Parameters:
+grids is an integer array-like of shape (N, size, size), 0 for empty cells
+
+Return: BatchReport
+'''
+def validate_batch(grids):
+    grids = np.asarray(grids)
+    if grids.ndim != 3 or grids.shape[1] != grids.shape[2] or math.isqrt(grids.shape[1]) ** 2 != grids.shape[1]:
+        raise ValueError(f'expected an array of shape (N, size, size), got {grids.shape}')
+    if len(grids) == 0:
+        return BatchReport(*validate_chunk(grids))
+    parts = [validate_chunk(grids[start:start + CHUNK]) for start in range(0, len(grids), CHUNK)]
+    if len(parts) == 1:
+        return BatchReport(*parts[0])
+    return BatchReport(*(np.concatenate(arrays) for arrays in zip(*parts)))
+
+'''
+Compares a batch of boards against their stored solutions
+
+Parameters:
+grids and solutions are integer array-likes of the same shape (N, size, size)
+
+Return: dict of arrays
+matches		- (N,) bool, the board equals its solution
+wrong		- (N, size, size) bool, a filled cell that differs from the solution
+wrong_count	- (N,) number of wrong cells
+empty_count	- (N,) number of empty cells
+'''
+def compare_solutions(grids, solutions):
+    grids = np.asarray(grids)
+    solutions = np.asarray(solutions)
+    if grids.shape != solutions.shape:
+        raise ValueError(f'grids {grids.shape} and solutions {solutions.shape} differ in shape')
+    filled = grids != 0
+    wrong = filled & (grids != solutions)
+    return {
+        'matches': (grids == solutions).all(axis=(1, 2)),
+        'wrong': wrong,
+        'wrong_count': wrong.sum(axis=(1, 2)),
+        'empty_count': (~filled).sum(axis=(1, 2)),
+    }
+
+'''
+Parses lines of cell characters (the sudoku_cli line format) into an (N, size, size) array
+Every line must describe a board of the same size
+
+Return: uint8 array
+'''
+CHAR_TABLE = bytearray(b'\xff' * 256)
+for char, value in CELL_VALUES.items():
+    CHAR_TABLE[ord(char)] = value
+CHAR_TABLE = bytes(CHAR_TABLE)
+
+def from_lines(lines):
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        return np.zeros((0, 9, 9), dtype=np.uint8)
+    cells = len(lines[0])
+    size = math.isqrt(cells)
+    if size * size != cells or any(len(line) != cells for line in lines):
+        raise ValueError('every line must hold the same square number of cells')
+    data = np.frombuffer(''.join(lines).encode('latin-1').translate(CHAR_TABLE), dtype=np.uint8)
+    if (data == 0xff).any():
+        raise ValueError('unexpected cell character')
+    return data.reshape(len(lines), size, size)
+
+'''
+Validates boards read from stdin, one per line, and prints a summary:
+python3 sudoku_validate.py < solved.txt
+'''
+if __name__ == '__main__':
+    report = validate_batch(from_lines(sys.stdin))
+    invalid = np.flatnonzero(~report.valid)
+    print(f'{len(report.valid)} boards, {len(report.valid) - len(invalid)} valid, '
+          f'{int(report.complete.sum())} complete, {int(report.conflicts.any(axis=(1, 2)).sum())} with conflicts')
+    for i in invalid[:20]:
+        print(f'board {i}: conflicts at {report.conflict_positions(i)}')
@@ -0,0 +1,22 @@
+import numpy as np
+from sudoku_validate import from_lines, validate_batch
+
+SOLVED = '534678912672195348198342567859761423426853791713924856961537284287419635345286179'
+
+def test_empty_batch():
+    report = validate_batch(np.zeros((0, 9, 9), dtype=np.uint8))
+    assert report.valid.shape == (0,)
+    assert report.complete.shape == (0,)
+    assert report.rows_ok.shape == (0, 9)
+    assert report.conflicts.shape == (0, 9, 9)
+
+def test_empty_input_lines():
+    report = validate_batch(from_lines([]))
+    assert len(report.valid) == 0
+
+def test_solved_and_conflicting_boards():
+    broken = '55' + SOLVED[2:]
+    report = validate_batch(from_lines([SOLVED, broken]))
+    assert report.valid.tolist() == [True, False]
+    assert report.conflict_positions(0) == []
+    assert (0, 0) in report.conflict_positions(1) and (0, 1) in report.conflict_positions(1)